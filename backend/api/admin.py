@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from .models import SlowQuery
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = (
+        'normalized_sql',
+        'view',
+        'calls',
+        'max_duration',
+        'total_duration',
+        'last_seen',
+    )
+    list_filter = ('view', 'database')
+    search_fields = ('normalized_sql', 'view')
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,190 @@
+"""Асинхронные обёртки представлений для работы под ASGI.
+
+В Django 3.2 нет асинхронного ORM, а синхронные представления под ASGI
+выполняются по очереди в одном потоке. Обёртка запускает всё
+представление DRF (аутентификацию, запросы, сериализацию и рендеринг)
+одним вызовом sync_to_async в пуле потоков, поэтому медленные клиенты
+и выгрузка списка покупок не блокируют остальные запросы воркера.
+
+Потоковое тело Django 3.2 перебирает прямо в цикле событий, где
+обращения к базе запрещены. Для асинхронных маршрутов тело читается
+частями в отдельном потоке и отправляется StreamingASGIHandler по мере
+готовности, не накапливаясь в памяти.
+
+Соединения с базой у каждого потока свои, поэтому обёртки запросов
+ServerTimingMiddleware и SlowQueryMiddleware подключаются заново в
+потоке представления и в потоке тела.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import URLPattern, URLResolver
+
+from backend.instrumentation import render_response, request_wrappers
+
+ASYNC_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+    'recipes-feed',
+    'recipes-download-shopping-cart',
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEW_THREADS,
+    thread_name_prefix='async-view',
+)
+
+
+class ThreadedBody:
+    """Асинхронный итератор потокового тела, читаемого в своём потоке.
+
+    Все части читаются в одном потоке: курсор, открытый генератором
+    тела, нельзя продолжать в другом потоке.
+    """
+
+    end = object()
+
+    def __init__(self, iterable, request):
+        self.iterable = iterable
+        self.request = request
+        self.iterator = None
+        self.stack = ExitStack()
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='async-body'
+        )
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        part = await self.run(self.next_part)
+        if part is self.end:
+            raise StopAsyncIteration
+        return part
+
+    async def aclose(self):
+        try:
+            await self.run(self.close)
+        finally:
+            self.executor.shutdown(wait=False)
+
+    def run(self, function):
+        return asyncio.get_running_loop().run_in_executor(
+            self.executor, function
+        )
+
+    def next_part(self):
+        if self.iterator is None:
+            self.stack.enter_context(request_wrappers(self.request))
+            self.iterator = iter(self.iterable)
+        return next(self.iterator, self.end)
+
+    def close(self):
+        try:
+            self.stack.close()
+        finally:
+            close_old_connections()
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняет представление; потоковое тело читается позже."""
+
+    try:
+        with request_wrappers(request):
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response = render_response(request, response)
+        if response.streaming:
+            response.async_streaming_content = ThreadedBody(
+                response.streaming_content, request
+            )
+        return response
+    finally:
+        close_old_connections()
+
+
+def to_async(view):
+    """Асинхронное представление, выполняющее view в пуле потоков."""
+
+    run = sync_to_async(run_view, thread_sensitive=False, executor=executor)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await run(view, request, *args, **kwargs)
+
+    return async_view
+
+
+def make_async(patterns, routes=ASYNC_ROUTES):
+    """Копия URL-схемы, в которой маршруты routes асинхронные."""
+
+    result = []
+    for entry in patterns:
+        if isinstance(entry, URLResolver):
+            entry = URLResolver(
+                entry.pattern,
+                make_async(entry.url_patterns, routes),
+                entry.default_kwargs,
+                entry.app_name,
+                entry.namespace,
+            )
+        elif isinstance(entry, URLPattern) and entry.name in routes:
+            entry = URLPattern(
+                entry.pattern,
+                to_async(entry.callback),
+                entry.default_args,
+                entry.name,
+            )
+        result.append(entry)
+    return result
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGIHandler, отправляющий async_streaming_content по частям."""
+
+    async def send_response(self, response, send):
+        body = getattr(response, 'async_streaming_content', None)
+        if body is None:
+            await super().send_response(response, send)
+            return
+        headers = [
+            (
+                header.encode('ascii') if isinstance(header, str)
+                else bytes(header),
+                value.encode('latin1') if isinstance(value, str)
+                else bytes(value),
+            )
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        try:
+            async for part in body:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            await body.aclose()
+            await sync_to_async(response.close, thread_sensitive=True)()
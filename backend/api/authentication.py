@@ -0,0 +1,53 @@
+"""Аутентификация по токену с кешированием пользователя."""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+# Поля пользователя, которые нужны правам доступа и сериализаторам.
+# Хеш пароля и счётчики в кеш не попадают: пароль догружается при
+# смене, а save() отложенного экземпляра не перезаписывает счётчики.
+AUTH_USER_FIELDS = (
+    'id',
+    'username',
+    'email',
+    'first_name',
+    'last_name',
+    'is_active',
+    'is_staff',
+    'is_superuser',
+)
+
+
+def get_token_cache_key(key):
+    return f'auth-token:{key}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, хранящий токен с пользователем в кеше.
+
+    Запись удаляется при выходе, изменении и удалении пользователя
+    (api.signals) и живёт не дольше AUTH_TOKEN_CACHE_TIMEOUT.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = get_token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').only(
+                    'key',
+                    'user',
+                    *(f'user__{field}' for field in AUTH_USER_FIELDS),
+                ).get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            cache.set(cache_key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return (token.user, token)
@@ -0,0 +1,47 @@
+"""Кеширование ответов со справочными данными."""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from recipes.versions import get_version
+
+
+class VersionedCacheMixin:
+    """Кеширует данные ответов list/retrieve по поколению таблиц.
+
+    Ключ включает версии таблиц version_models, поэтому после их
+    изменения старые записи больше не читаются и вытесняются по
+    истечении REFERENCE_CACHE_TIMEOUT.
+    """
+
+    version_models = ()
+
+    def get_cache_key(self, request):
+        versions = '-'.join(
+            str(get_version(model)[0]) for model in self.version_models
+        )
+        path = hashlib.md5(
+            request.get_full_path().encode('utf-8')
+        ).hexdigest()
+        return f'response:{self.basename}:{versions}:{path}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.REFERENCE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
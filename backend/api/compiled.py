@@ -0,0 +1,202 @@
+"""Чтение рецептов и ингредиентов без создания экземпляров моделей.
+
+Ответ собирается из строк values() функциями, подготовленными один раз
+на запрос под выбранный набор полей, и повторяет вывод
+RecipeReadSerializer, IngredientReadSerializer и
+CommonIngredientSerializer байт в байт. Совпадение проверяет команда
+check_compiled_read.
+"""
+
+from operator import itemgetter
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from recipes.images import IMAGE_VARIANTS, variant_fields
+from recipes.models import (
+    RECIPE_READ_COLUMNS,
+    RECIPE_USER_FLAGS,
+    NumberOfIngredients,
+    Recipe,
+)
+
+from .serializers import CommonIngredientSerializer, TagSerializer
+
+# Поля вложенных сериализаторов и колонки, из которых они берутся.
+AUTHOR_COLUMNS = {
+    'email': 'author__email',
+    'id': 'author',
+    'username': 'author__username',
+    'first_name': 'author__first_name',
+    'last_name': 'author__last_name',
+    'is_subscribed': 'author_is_subscribed',
+}
+TAG_COLUMNS = {field: f'tag__{field}' for field in TagSerializer.Meta.fields}
+RECIPE_INGREDIENT_COLUMNS = {
+    'id': 'ingredients__id',
+    'name': 'ingredients__name',
+    'measurement_unit': 'ingredients__measurement_unit',
+    'amount': 'amount',
+}
+
+
+def get_columns(fields):
+    """Колонки values() для полей ответа fields."""
+
+    columns = ['id', 'pub_date']
+    for field in fields:
+        if field in RECIPE_USER_FLAGS:
+            columns.append(field)
+        elif field == 'author':
+            columns.extend(AUTHOR_COLUMNS.values())
+        else:
+            columns.extend(RECIPE_READ_COLUMNS.get(field, ()))
+    return list(dict.fromkeys(columns))
+
+
+def recipe_values(queryset, fields):
+    """Строки рецептов queryset с колонками для полей fields."""
+
+    return queryset.prefetch_related(None).values(*get_columns(fields))
+
+
+def group_by_recipe(rows, columns):
+    """Словари связанных объектов по id рецепта в порядке rows."""
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['recipe_id'], []).append(
+            {field: row[column] for field, column in columns.items()}
+        )
+    return groups
+
+
+def get_tags(ids):
+    return group_by_recipe(
+        Recipe.tags.through.objects.filter(recipe_id__in=ids).order_by(
+            'tag_id'
+        ).values('recipe_id', *TAG_COLUMNS.values()),
+        TAG_COLUMNS,
+    )
+
+
+def get_ingredients(ids):
+    return group_by_recipe(
+        NumberOfIngredients.objects.filter(recipe_id__in=ids).order_by(
+            'pk'
+        ).values('recipe_id', *RECIPE_INGREDIENT_COLUMNS.values()),
+        RECIPE_INGREDIENT_COLUMNS,
+    )
+
+
+def make_url_getter(field, request):
+    """URL файла по имени из колонки field, как у FileField.url."""
+
+    storage = Recipe._meta.get_field(field).storage
+    if request is None:
+        return storage.url
+    return lambda name: request.build_absolute_uri(storage.url(name))
+
+
+def build_author(row):
+    if row['author'] is None:
+        return None
+    return {
+        field: row[column] for field, column in AUTHOR_COLUMNS.items()
+    }
+
+
+def make_image_builder(request):
+    get_url = make_url_getter('image', request)
+
+    def build(row):
+        return get_url(row['image']) if row['image'] else None
+
+    return build
+
+
+def make_variants_builder(request):
+    variants = []
+    for variant in IMAGE_VARIANTS:
+        column, width, height = variant_fields(variant)
+        variants.append((
+            variant, column, width, height, make_url_getter(column, request)
+        ))
+
+    def build(row):
+        result = {}
+        for variant, column, width, height, get_url in variants:
+            if row[column]:
+                result[variant] = {
+                    'url': get_url(row[column]),
+                    'width': row[width],
+                    'height': row[height],
+                }
+        return result
+
+    return build
+
+
+def make_related_builder(related):
+    return lambda row: related.get(row['id'], [])
+
+
+def compile_recipes(rows, fields, request):
+    """Рецепты в формате RecipeReadSerializer с полями fields.
+
+    Тэги и ингредиенты загружаются двумя запросами на все строки.
+    """
+
+    rows = list(rows)
+    ids = [row['id'] for row in rows]
+    builders = []
+    for field in fields:
+        if field == 'author':
+            build = build_author
+        elif field == 'tags':
+            build = make_related_builder(get_tags(ids))
+        elif field == 'ingredients':
+            build = make_related_builder(get_ingredients(ids))
+        elif field == 'image':
+            build = make_image_builder(request)
+        elif field == 'image_variants':
+            build = make_variants_builder(request)
+        else:
+            build = itemgetter(field)
+        builders.append((field, build))
+    return [
+        {field: build(row) for field, build in builders} for row in rows
+    ]
+
+
+def ingredient_values(queryset):
+    """Ингредиенты в формате CommonIngredientSerializer."""
+
+    return queryset.values(*CommonIngredientSerializer.Meta.fields)
+
+
+class CompiledListMixin:
+    """list() без сериализатора, если включён COMPILED_READ.
+
+    Наследники переопределяют get_compiled_rows(), выбирающий строки
+    values() из отфильтрованного queryset (по умолчанию все поля
+    модели), и compile_rows(), собирающий ответ из строк страницы.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not settings.COMPILED_READ:
+            return super().list(request, *args, **kwargs)
+        return self.compiled_list(self.filter_queryset(self.get_queryset()))
+
+    def get_compiled_rows(self, queryset):
+        return queryset.values()
+
+    def compile_rows(self, rows):
+        return list(rows)
+
+    def compiled_list(self, queryset):
+        rows = self.get_compiled_rows(queryset)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(self.compile_rows(rows))
+        return self.get_paginated_response(self.compile_rows(page))
@@ -0,0 +1,71 @@
+"""Условные GET-запросы: ETag и Last-Modified."""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.permissions import SAFE_METHODS
+
+from recipes.versions import get_version
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(
+        '|'.join(map(str, parts)).encode('utf-8')
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 до сериализации, если данные не изменились.
+
+    Наследники переопределяют get_validators(), возвращающий ETag и
+    время последнего изменения (любое из значений может быть None). По
+    умолчанию валидаторов нет и запрос обрабатывается как обычно.
+    """
+
+    vary_headers = ()
+
+    def get_validators(self, request, *args, **kwargs):
+        return None, None
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = self.get_validators(request, *args, **kwargs)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if etag:
+                response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_vary_headers(response, self.vary_headers)
+        return response
+
+
+class VersionedConditionalGetMixin(ConditionalGetMixin):
+    """Валидаторы по версиям таблиц version_models для list/retrieve."""
+
+    version_models = ()
+
+    def get_validators(self, request, *args, **kwargs):
+        versions = [get_version(model) for model in self.version_models]
+        return (
+            make_etag(*(version for version, _ in versions)),
+            max(updated_at for _, updated_at in versions),
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -0,0 +1,64 @@
+"""Выбор полей ответа параметрами запроса fields и omit."""
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+from .serializers import SparseFieldsMixin
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+UNKNOWN_FIELDS = 'Неизвестные поля: {fields}'
+
+
+class SparseFieldsetMixin:
+    """Поля ответа GET-запросов по параметрам fields и omit.
+
+    fields перечисляет поля через запятую, omit исключает поля из этого
+    списка или из набора по умолчанию. default_fields задаёт облегчённые
+    наборы полей для действий, остальные действия по умолчанию отдают
+    все поля сериализатора.
+    """
+
+    default_fields = {}
+
+    def get_response_fields(self, serializer_class=None):
+        """Поля ответа или None, если нужны все поля сериализатора."""
+
+        serializer_class = serializer_class or self.get_serializer_class()
+        if (
+            self.request.method not in SAFE_METHODS
+            or not issubclass(serializer_class, SparseFieldsMixin)
+        ):
+            return None
+        available = serializer_class.Meta.fields
+        selected = self.parse_fields(FIELDS_PARAM, available)
+        omitted = self.parse_fields(OMIT_PARAM, available)
+        if selected is None:
+            if omitted is None and self.action not in self.default_fields:
+                return None
+            selected = self.default_fields.get(self.action, available)
+        return tuple(
+            field for field in available
+            if field in selected and field not in (omitted or ())
+        )
+
+    def parse_fields(self, param, available):
+        """Поля из параметра param; пустой параметр не учитывается."""
+
+        value = self.request.query_params.get(param, '')
+        fields = [field.strip() for field in value.split(',')]
+        fields = [field for field in fields if field]
+        if not fields:
+            return None
+        unknown = set(fields) - set(available)
+        if unknown:
+            raise ValidationError({param: [UNKNOWN_FIELDS.format(
+                fields=', '.join(sorted(unknown))
+            )]})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_response_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
@@ -33,16 +33,30 @@ class RecipeFilter(filters.FilterSet):
         method='shopping_cart_filter'
     )
     tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    search = filters.CharFilter(method='search_filter')
+
+    def search_filter(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, описанию, тэгам
+        и ингредиентам."""
+
+        return queryset.search(value)
 
     def favorite_filter(self, queryset, name, value):
         """Функция обработки пременной get_is_favorited."""
 
-        return Recipe.objects.filter(favorite__user=self.request.user)
+        return self._user_flag_filter(queryset, name, value)
 
     def shopping_cart_filter(self, queryset, name, value):
         """Функция обработки пременной get_is_in_shopping_cart."""
 
-        return Recipe.objects.filter(shopping_cart__user=self.request.user)
+        return self._user_flag_filter(queryset, name, value)
+
+    def _user_flag_filter(self, queryset, name, value):
+        """Фильтрует по флагу, аннотированному в RecipeQuerySet."""
+
+        if name not in queryset.query.annotations:
+            queryset = queryset.with_user_flags(self.request.user, [name])
+        return queryset.filter(**{name: value})
 
     class Meta:
         """Дополнительные параметры фильтра."""
@@ -0,0 +1,124 @@
+"""Индекс ингредиентов в памяти процесса для автодополнения."""
+
+import heapq
+import sys
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from recipes.models import Ingredient
+from recipes.search import (
+    SIMILARITY_THRESHOLD,
+    WORD_RE,
+    WORD_SIMILARITY_THRESHOLD,
+)
+from recipes.versions import get_version
+
+
+def trigrams(text):
+    """Множество триграмм строки по правилам pg_trgm."""
+
+    grams = set()
+    for word in WORD_RE.findall(text.casefold()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class IngredientIndex:
+    """Отсортированный по casefold-имени массив сериализованных ингредиентов.
+
+    Поиск по префиксу выполняется двумя бинарными поисками и возвращает
+    те же строки, что и CommonIngredientSerializer для фильтра
+    name__istartswith, в том же порядке (по id). Для ранжированного
+    поиска рядом хранятся списки позиций по триграммам. Индекс строится
+    лениво и перестраивается, когда меняется версия таблицы ингредиентов,
+    в том числе после изменений, сделанных другими процессами.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._rows = None
+        self._postings = None
+        self._sizes = None
+        self._version = None
+
+    def _build(self):
+        from .serializers import CommonIngredientSerializer
+
+        rows = CommonIngredientSerializer(
+            Ingredient.objects.all(), many=True
+        ).data
+        entries = sorted(
+            ((row['name'].casefold(), row['id'], row) for row in rows),
+            key=itemgetter(0, 1),
+        )
+        self._keys = [key for key, _, _ in entries]
+        self._rows = [row for _, _, row in entries]
+        self._postings = defaultdict(list)
+        self._sizes = []
+        for position, key in enumerate(self._keys):
+            grams = trigrams(key)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(position)
+
+    def _get(self):
+        version, _ = get_version(Ingredient)
+        with self._lock:
+            if self._version != version:
+                self._build()
+                self._version = version
+            return self._keys, self._rows, self._postings, self._sizes
+
+    def search(self, prefix):
+        """Возвращает ингредиенты, имя которых начинается с prefix."""
+
+        keys, rows, _, _ = self._get()
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + chr(sys.maxunicode), lo=start)
+        return sorted(rows[start:end], key=itemgetter('id'))
+
+    def rank(self, query, limit):
+        """Возвращает не более limit ингредиентов, похожих на query.
+
+        Повторяет поиск pg_trgm: подходят имена со сходством не ниже
+        SIMILARITY_THRESHOLD или со сходством по словам не ниже
+        WORD_SIMILARITY_THRESHOLD (здесь — доля триграмм запроса,
+        найденных в имени). Сортировка по большей из двух оценок,
+        затем по длине имени.
+        """
+
+        keys, rows, postings, sizes = self._get()
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(postings.get(gram, ()))
+        scored = []
+        for position, common in shared.items():
+            similarity = common / (
+                len(query_grams) + sizes[position] - common
+            )
+            word_similarity = common / len(query_grams)
+            if (
+                similarity >= SIMILARITY_THRESHOLD
+                or word_similarity >= WORD_SIMILARITY_THRESHOLD
+            ):
+                scored.append((
+                    -max(similarity, word_similarity),
+                    len(keys[position]),
+                    rows[position]['id'],
+                    position,
+                ))
+        return [
+            rows[position]
+            for *_, position in heapq.nsmallest(limit, scored)
+        ]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,242 @@
+import json
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.urls import router_v1
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import User
+
+# Метка, метод, имя маршрута, объект для URL, параметры запроса.
+# Пары POST/DELETE выполняются подряд, чтобы данные не менялись.
+ENDPOINTS = (
+    ('tags-list', 'get', 'tags-list', None, {}),
+    ('tags-detail', 'get', 'tags-detail', 'tag', {}),
+    ('ingredients-list', 'get', 'ingredients-list', None, {}),
+    ('ingredients-prefix', 'get', 'ingredients-list', None, 'prefix'),
+    ('ingredients-search', 'get', 'ingredients-list', None, 'similar'),
+    ('ingredients-detail', 'get', 'ingredients-detail', 'ingredient', {}),
+    ('recipes-list', 'get', 'recipes-list', None, {}),
+    ('recipes-list-keyset', 'get', 'recipes-list', None, {'cursor': ''}),
+    (
+        'recipes-list-sparse', 'get', 'recipes-list', None,
+        {'fields': 'id,name,image,cooking_time'},
+    ),
+    ('recipes-filter', 'get', 'recipes-list', None, 'filter'),
+    ('recipes-search', 'get', 'recipes-list', None, 'search'),
+    ('recipes-detail', 'get', 'recipes-detail', 'recipe', {}),
+    ('recipes-feed', 'get', 'recipes-feed', None, {}),
+    (
+        'recipes-download-shopping-cart', 'get',
+        'recipes-download-shopping-cart', None, {},
+    ),
+    ('recipes-favorite:post', 'post', 'recipes-favorite', 'fresh', {}),
+    ('recipes-favorite:delete', 'delete', 'recipes-favorite', 'fresh', {}),
+    (
+        'recipes-shopping-cart:post', 'post',
+        'recipes-shopping-cart', 'fresh', {},
+    ),
+    (
+        'recipes-shopping-cart:delete', 'delete',
+        'recipes-shopping-cart', 'fresh', {},
+    ),
+    ('users-list', 'get', 'users-list', None, {}),
+    ('users-me', 'get', 'users-me', None, {}),
+    ('users-detail', 'get', 'users-detail', 'author', {}),
+    ('users-subscriptions', 'get', 'users-subscriptions', None, {}),
+    ('users-subscribe:post', 'post', 'users-subscribe', 'stranger', {}),
+    ('users-subscribe:delete', 'delete', 'users-subscribe', 'stranger', {}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs API routes through the test client and reports p50/p95 '
+        'latency, SQL query count and response size per endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--username',
+            help='User to authenticate as (default: a user with a cart)',
+        )
+        parser.add_argument(
+            '--only', nargs='+', default=(),
+            help='Benchmark only the given labels',
+        )
+        parser.add_argument(
+            '--budget', action='append', default=[], metavar='LABEL=N',
+            help='Query budget for an endpoint, overrides API_QUERY_BUDGETS',
+        )
+        parser.add_argument(
+            '--budgets-file',
+            help='JSON object {label: max queries} merged over the defaults',
+        )
+        parser.add_argument(
+            '--json', action='store_true', help='Print results as JSON'
+        )
+
+    def handle(self, *args, **options):
+        budgets = self.get_budgets(options)
+        user = self.get_user(options['username'])
+        objects = self.get_objects(user)
+        client = APIClient()
+        client.force_authenticate(user)
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if not options['only'] or endpoint[0] in options['only']
+        ]
+        requests = []
+        for label, method, route, target, params in endpoints:
+            if target and objects.get(target) is None:
+                self.stderr.write(f'{label}: нет подходящих данных, пропуск')
+                continue
+            kwargs = {}
+            if target:
+                lookup = 'id' if route.startswith('users-') else 'pk'
+                kwargs[lookup] = objects[target].pk
+            if isinstance(params, str):
+                params = objects[params]
+            requests.append((
+                label, method, reverse(f'api:{route}', kwargs=kwargs), params
+            ))
+        results = self.measure(client, requests, options['repeat'])
+        self.report(results, budgets, options['json'])
+        self.report_uncovered()
+        exceeded = [
+            f'{label}: {result["queries"]} > {budgets[label]}'
+            for label, result in results.items()
+            if label in budgets and result['queries'] > budgets[label]
+        ]
+        if exceeded:
+            raise CommandError(
+                'Превышен бюджет запросов — ' + '; '.join(exceeded)
+            )
+
+    @staticmethod
+    def get_budgets(options):
+        budgets = dict(settings.API_QUERY_BUDGETS)
+        if options['budgets_file']:
+            with open(options['budgets_file'], encoding='utf-8') as file:
+                budgets.update(json.load(file))
+        for budget in options['budget']:
+            label, _, value = budget.partition('=')
+            if not value.isdigit():
+                raise CommandError(f'Некорректный бюджет: {budget}')
+            budgets[label] = int(value)
+        return budgets
+
+    @staticmethod
+    def get_user(username):
+        if username:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                raise CommandError(f'Пользователь {username} не найден')
+            return user
+        user_id = ShoppingCart.objects.values_list('user', flat=True).first()
+        user = User.objects.filter(pk=user_id).first() or User.objects.first()
+        if user is None:
+            raise CommandError('Нет пользователей: выполните generate_dataset')
+        return user
+
+    @staticmethod
+    def get_objects(user):
+        ingredient = Ingredient.objects.first()
+        tag = Tag.objects.first()
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        word = recipe.name.split()[0] if recipe else ''
+        return {
+            'tag': tag,
+            'ingredient': ingredient,
+            'recipe': recipe,
+            'author': recipe.author if recipe else None,
+            'fresh': Recipe.objects.exclude(
+                favorite__user=user
+            ).exclude(shopping_cart__user=user).first(),
+            'stranger': User.objects.exclude(pk=user.pk).exclude(
+                following__user=user
+            ).first(),
+            'prefix': {'name': ingredient.name[:2] if ingredient else ''},
+            'similar': {'search': ingredient.name if ingredient else ''},
+            'filter': {
+                'is_favorited': 1 if Favorite.objects.filter(
+                    user=user
+                ).exists() else 0,
+                'tags': tag.slug if tag else '',
+            },
+            'search': {'search': word},
+        }
+
+    @staticmethod
+    def consume(response):
+        if response.streaming:
+            return len(b''.join(response.streaming_content))
+        return len(response.content)
+
+    def measure(self, client, requests, repeat):
+        # Прогрев: кеши версий и справочников заполняются до замеров.
+        for _, method, url, params in requests:
+            self.consume(getattr(client, method)(url, params))
+        results = {}
+        for label, method, url, params in requests:
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(url, params)
+                size = self.consume(response)
+            results[label] = {
+                'method': method.upper(),
+                'url': url,
+                'status': response.status_code,
+                'queries': len(queries),
+                'bytes': size,
+                'timings': [],
+            }
+        for _ in range(repeat):
+            for label, method, url, params in requests:
+                start = time.perf_counter()
+                self.consume(getattr(client, method)(url, params))
+                results[label]['timings'].append(
+                    (time.perf_counter() - start) * 1000
+                )
+        for result in results.values():
+            timings = sorted(result.pop('timings')) or [0.0]
+            result['p50'] = statistics.median(timings)
+            result['p95'] = timings[math.ceil(len(timings) * 0.95) - 1]
+        return results
+
+    def report(self, results, budgets, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f'{"Эндпоинт":32} {"код":>4} {"p50 мс":>8} {"p95 мс":>8} '
+            f'{"SQL":>4} {"бюджет":>6} {"байт":>9}'
+        )
+        for label, result in results.items():
+            line = (
+                f'{label:32} {result["status"]:>4} {result["p50"]:>8.2f} '
+                f'{result["p95"]:>8.2f} {result["queries"]:>4} '
+                f'{budgets.get(label, "-"):>6} {result["bytes"]:>9}'
+            )
+            if label in budgets and result['queries'] > budgets[label]:
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+
+    def report_uncovered(self):
+        covered = {route for _, _, route, _, _ in ENDPOINTS}
+        uncovered = sorted({
+            pattern.name for pattern in router_v1.urls
+            if pattern.name not in covered and pattern.name != 'api-root'
+        })
+        if uncovered:
+            self.stdout.write(
+                'Без замеров (изменяющие и служебные маршруты): '
+                + ', '.join(uncovered)
+            )
@@ -0,0 +1,147 @@
+import asyncio
+import math
+import statistics
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.authtoken.models import Token
+
+from api.async_views import StreamingASGIHandler
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares one synchronous WSGI worker with one ASGI event loop '
+        'serving the same route to concurrent slow clients'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/recipes/')
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument(
+            '--client-delay', type=float, default=20,
+            help='Milliseconds a client spends reading each body chunk',
+        )
+        parser.add_argument(
+            '--username', help='Authenticate requests with this user token'
+        )
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(
+                    f'Пользователь {options["username"]} не найден'
+                )
+            token, _ = Token.objects.get_or_create(user=user)
+            headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        delay = options['client_delay'] / 1000
+        with override_settings(ROOT_URLCONF='backend.urls'):
+            wsgi = self.run_wsgi(
+                options['path'], headers, options['requests'], delay
+            )
+        with override_settings(ROOT_URLCONF='backend.urls_async'):
+            asgi = asyncio.run(self.run_asgi(
+                options['path'], headers, options['requests'],
+                options['concurrency'], delay,
+            ))
+        self.stdout.write(
+            f'{"Режим":6} {"запросов/с":>11} {"p50 мс":>8} {"p95 мс":>8} '
+            f'{"ошибок":>7}'
+        )
+        for name, (elapsed, timings, errors) in (
+            ('WSGI', wsgi), ('ASGI', asgi)
+        ):
+            self.stdout.write(
+                f'{name:6} {options["requests"] / elapsed:>11.1f} '
+                f'{statistics.median(timings):>8.1f} '
+                f'{self.percentile(timings, 0.95):>8.1f} {errors:>7}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Прирост пропускной способности ASGI: '
+            f'{wsgi[0] / asgi[0]:.1f}x'
+        ))
+
+    @staticmethod
+    def percentile(timings, share):
+        timings = sorted(timings)
+        return timings[math.ceil(len(timings) * share) - 1]
+
+    @staticmethod
+    def run_wsgi(path, headers, count, delay):
+        """Один sync-воркер: клиенты обслуживаются строго по очереди."""
+
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        timings = []
+        statuses = []
+        started = time.perf_counter()
+        for _ in range(count):
+            start = time.perf_counter()
+            environ = factory.get(path, **headers).environ
+            result = handler(
+                environ, lambda status, *args: statuses.append(status)
+            )
+            try:
+                for _ in result:
+                    time.sleep(delay)
+            finally:
+                result.close()
+            timings.append((time.perf_counter() - start) * 1000)
+        errors = sum(not status.startswith('2') for status in statuses)
+        return time.perf_counter() - started, timings, errors
+
+    @staticmethod
+    async def run_asgi(path, headers, count, concurrency, delay):
+        """Один ASGI-воркер: до concurrency клиентов одновременно."""
+
+        handler = StreamingASGIHandler()
+        semaphore = asyncio.Semaphore(concurrency)
+        raw_headers = [(b'host', b'testserver')] + [
+            (
+                name[5:].lower().replace('_', '-').encode(),
+                value.encode(),
+            )
+            for name, value in headers.items()
+        ]
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'headers': raw_headers,
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        timings = []
+        statuses = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+            elif message['type'] == 'http.response.body':
+                await asyncio.sleep(delay)
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                await handler(dict(scope), receive, send)
+                timings.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(count)))
+        errors = sum(not 200 <= status < 300 for status in statuses)
+        return time.perf_counter() - started, timings, errors
@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.core.management import BaseCommand
+
+from api.filters import IngredientFilter
+from api.ingredient_index import ingredient_index
+from api.serializers import CommonIngredientSerializer
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = 'Compares ingredient prefix search: ORM vs in-memory index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--prefix-length', type=int, nargs='+', default=[1, 2, 3]
+        )
+
+    def handle(self, *args, **options):
+        names = Ingredient.objects.values_list('name', flat=True)
+        for length in options['prefix_length']:
+            prefixes = sorted({name[:length] for name in names if name})
+            if not prefixes:
+                continue
+            orm = self.measure(self.search_orm, prefixes, options['repeat'])
+            index = self.measure(
+                ingredient_index.search, prefixes, options['repeat']
+            )
+            self.stdout.write(
+                f'Префикс {length} симв. ({len(prefixes)} шт.): '
+                f'ORM {orm[0]:.3f} / {orm[1]:.3f} мс, '
+                f'индекс {index[0]:.3f} / {index[1]:.3f} мс '
+                f'(медиана / p95)'
+            )
+
+    @staticmethod
+    def search_orm(prefix):
+        queryset = IngredientFilter(
+            {'name': prefix}, queryset=Ingredient.objects.all()
+        ).qs
+        return CommonIngredientSerializer(queryset, many=True).data
+
+    @staticmethod
+    def measure(search, prefixes, repeat):
+        search(prefixes[0])
+        timings = []
+        for _ in range(repeat):
+            for prefix in prefixes:
+                start = time.perf_counter()
+                search(prefix)
+                timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return (
+            statistics.median(timings),
+            timings[int(len(timings) * 0.95) - 1],
+        )
@@ -0,0 +1,126 @@
+from urllib.parse import urlencode
+
+from django.core.management import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.serializers import RecipeReadSerializer
+from recipes.models import Favorite, Ingredient, Recipe, Tag
+from users.models import User
+
+# Кеш ответов справочников отключается: иначе второй путь чтения вернул
+# бы данные, сохранённые первым.
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares list responses of the compiled read path and the orjson '
+        'renderer with DRF serializers and JSONRenderer byte for byte'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument(
+            '--username',
+            help='User to authenticate as (default: a user with favorites)',
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        client = APIClient()
+        client.force_authenticate(user)
+        clients = (
+            ('аноним', APIClient(), False),
+            (user.username, client, True),
+        )
+        mismatches = []
+        checked = 0
+        with override_settings(
+            CACHES=NO_CACHE, INGREDIENT_PREFIX_INDEX=False
+        ):
+            for name, client, authenticated in clients:
+                for url in self.get_urls(options['limit']):
+                    if 'feed' in url and not authenticated:
+                        continue
+                    pages = 0
+                    while url and pages < 2:
+                        error, url = self.compare(client, url)
+                        checked += 1
+                        pages += 1
+                        if error:
+                            mismatches.append(f'{name} {error}')
+        for mismatch in mismatches:
+            self.stderr.write(mismatch)
+        if mismatches:
+            raise CommandError(
+                f'Расхождений: {len(mismatches)} из {checked} ответов'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Ответы совпадают байт в байт: {checked}'
+        ))
+
+    @staticmethod
+    def get_user(username):
+        if username:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                raise CommandError(f'Пользователь {username} не найден')
+            return user
+        user_id = Favorite.objects.values_list('user', flat=True).first()
+        user = User.objects.filter(pk=user_id).first() or User.objects.first()
+        if user is None:
+            raise CommandError('Нет пользователей: выполните generate_dataset')
+        return user
+
+    @staticmethod
+    def get_urls(limit):
+        recipes = reverse('api:recipes-list')
+        ingredients = reverse('api:ingredients-list')
+        tag = Tag.objects.values_list('slug', flat=True).first() or ''
+        name = Recipe.objects.values_list('name', flat=True).first() or ''
+        ingredient = Ingredient.objects.values_list(
+            'name', flat=True
+        ).first() or ''
+        full = ','.join(RecipeReadSerializer.Meta.fields)
+        queries = (
+            (recipes, {}),
+            (recipes, {'fields': full}),
+            (recipes, {'omit': 'author,image_variants'}),
+            (recipes, {'is_favorited': 1, 'fields': full}),
+            (recipes, {'is_in_shopping_cart': 1}),
+            (recipes, {'tags': tag}),
+            (recipes, {'search': name.split(' ')[0]}),
+            (recipes, {'ordering': '-favorites_count'}),
+            (recipes, {'cursor': '', 'fields': full}),
+            (reverse('api:recipes-feed'), {'fields': full}),
+            (ingredients, None),
+            (ingredients, {'name': ingredient[:2]}),
+        )
+        return [
+            path if params is None
+            else f'{path}?{urlencode({"limit": limit, **params})}'
+            for path, params in queries
+        ]
+
+    @staticmethod
+    def compare(client, url):
+        """Описание расхождения для url и ссылка на следующую страницу."""
+
+        with override_settings(COMPILED_READ=False):
+            expected = client.get(url)
+        with override_settings(COMPILED_READ=True):
+            actual = client.get(url)
+        data = expected.data
+        next_url = data.get('next') if isinstance(data, dict) else None
+        if expected.status_code != 200:
+            return f'{url}: код ответа {expected.status_code}', None
+        if actual.content != expected.content:
+            return f'{url}: ответ compiled отличается', next_url
+        if JSONRenderer().render(data) != expected.content:
+            return f'{url}: вывод orjson отличается от JSONRenderer', next_url
+        return None, next_url
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True, verbose_name='Отпечаток запроса')),
+                ('normalized_sql', models.TextField(verbose_name='Вид запроса')),
+                ('sql', models.TextField(verbose_name='Последний пример')),
+                ('params', models.TextField(blank=True, verbose_name='Параметры примера')),
+                ('database', models.CharField(max_length=100, verbose_name='База данных')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='Представление')),
+                ('stack', models.TextField(blank=True, verbose_name='Стек вызова')),
+                ('stack_fingerprint', models.CharField(blank=True, max_length=40, verbose_name='Отпечаток стека')),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='Вызовов')),
+                ('total_duration', models.FloatField(default=0, verbose_name='Суммарное время, мс')),
+                ('max_duration', models.FloatField(default=0, verbose_name='Максимальное время, мс')),
+                ('plan', models.TextField(blank=True, verbose_name='План выполнения')),
+                ('first_seen', models.DateTimeField(auto_now_add=True, verbose_name='Впервые')),
+                ('last_seen', models.DateTimeField(verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-max_duration',),
+            },
+        ),
+    ]
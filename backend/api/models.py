@@ -0,0 +1,46 @@
+"""Создание моделей."""
+
+from django.db import models
+
+
+class SlowQuery(models.Model):
+    """Медленный SQL-запрос, сгруппированный по нормализованному виду."""
+
+    fingerprint = models.CharField(
+        verbose_name='Отпечаток запроса',
+        max_length=40,
+        unique=True,
+    )
+    normalized_sql = models.TextField(verbose_name='Вид запроса')
+    sql = models.TextField(verbose_name='Последний пример')
+    params = models.TextField(verbose_name='Параметры примера', blank=True)
+    database = models.CharField(verbose_name='База данных', max_length=100)
+    view = models.CharField(
+        verbose_name='Представление', max_length=200, blank=True
+    )
+    stack = models.TextField(verbose_name='Стек вызова', blank=True)
+    stack_fingerprint = models.CharField(
+        verbose_name='Отпечаток стека', max_length=40, blank=True
+    )
+    calls = models.PositiveIntegerField(verbose_name='Вызовов', default=0)
+    total_duration = models.FloatField(
+        verbose_name='Суммарное время, мс', default=0
+    )
+    max_duration = models.FloatField(
+        verbose_name='Максимальное время, мс', default=0
+    )
+    plan = models.TextField(verbose_name='План выполнения', blank=True)
+    first_seen = models.DateTimeField(
+        verbose_name='Впервые', auto_now_add=True
+    )
+    last_seen = models.DateTimeField(verbose_name='Последний раз')
+
+    class Meta:
+        """Дополнительные параметры модели."""
+
+        ordering = ('-max_duration',)
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+
+    def __str__(self):
+        return self.normalized_sql[:80]
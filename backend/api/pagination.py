@@ -1,6 +1,135 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class KeysetPagination(BasePagination):
+    """Постраничный вывод по ключу сортировки без COUNT и OFFSET.
+
+    Курсор хранит значения полей сортировки последней записи страницы,
+    поэтому стоимость любой страницы одинакова. Поля сортировки должны
+    однозначно определять порядок записей.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = LimitPageNumberPagination.page_size
+    page_size_query_param = LimitPageNumberPagination.page_size_query_param
+    max_page_size = 100
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, queryset.model)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_position_filter(self, position):
+        """Условие «строго после position» для составного ключа."""
+
+        conditions = []
+        for index, field in enumerate(self.fields):
+            lookup = 'lt' if self.ordering[index].startswith('-') else 'gt'
+            condition = Q(**{f'{field}__{lookup}': position[index]})
+            for previous, value in zip(self.fields[:index], position):
+                condition &= Q(**{previous: value})
+            conditions.append(condition)
+        return reduce(or_, conditions)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (BinasciiError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj):
+        if isinstance(obj, dict):
+            values = [obj[field] for field in self.fields]
+        else:
+            values = [getattr(obj, field) for field in self.fields]
+        encoded = json.dumps([
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in values
+        ])
+        return urlsafe_b64encode(encoded.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.last),
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class KeysetPaginationMixin:
+    """Включает KeysetPagination, если в запросе передан параметр cursor.
+
+    Первая страница запрашивается с пустым курсором (?cursor=), без
+    параметра используется pagination_class представления. Действия с
+    keyset_required=True всегда выводятся по курсору.
+    """
+
+    keyset_ordering = ('-id',)
+    keyset_required = False
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.keyset_required or KeysetPagination.cursor_query_param in (
+                self.request.query_params
+            ):
+                self._paginator = KeysetPagination(self.keyset_ordering)
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
@@ -0,0 +1,31 @@
+"""Разбор тела запросов."""
+
+import codecs
+import io
+
+import orjson
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser на orjson.
+
+    Тела в кодировках, отличных от UTF-8, и всё, что orjson не
+    разбирает (целые больше 64 бит, ошибки синтаксиса), обрабатывает
+    родительский класс, поэтому результат и сообщения об ошибках
+    совпадают с JSONParser.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not self.strict or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        data = stream.read()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return super().parse(
+                io.BytesIO(data), media_type, parser_context
+            )
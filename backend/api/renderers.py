@@ -0,0 +1,91 @@
+"""Рендереры ответов и согласование формата для выгрузки файлов."""
+
+import json
+
+import orjson
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# Даты orjson выводит иначе, чем DRF, поэтому они, как и Decimal,
+# ленивые строки и прочие типы, передаются кодировщику DRF.
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+)
+encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же выводом байт в байт.
+
+    Ответы с отступами (в том числе для BrowsableAPIRenderer) и данные,
+    которые orjson не кодирует, например словари с нестроковыми
+    ключами, отрисовывает родительский класс.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            self.ensure_ascii
+            or not self.compact
+            or self.get_indent(
+                accepted_media_type, renderer_context or {}
+            ) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=encoder.default, option=ORJSON_OPTIONS
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как и JSONRenderer, экранирует разделители строк U+2028 и U+2029.
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
+
+
+class FileRenderer(BaseRenderer):
+    """Рендерер для ответов, тело которых формирует само представление.
+
+    Используется только для выбора формата по параметру format; ответы
+    с ошибками выводятся как JSON.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class TxtRenderer(FileRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(FileRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(FileRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+class FormatContentNegotiation(DefaultContentNegotiation):
+    """Выбирает рендерер по параметру format, не учитывая Accept.
+
+    Без параметра используется первый рендерер представления.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query_param = self.settings.URL_FORMAT_OVERRIDE
+        format = format_suffix or request.query_params.get(format_query_param)
+        if format:
+            renderers = self.filter_renderers(renderers, format)
+        return renderers[0], renderers[0].media_type
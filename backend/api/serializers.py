@@ -1,19 +1,25 @@
 """Создание сериализаторов."""
 
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from recipes.images import IMAGE_VARIANTS, VARIANT_FIELDS, variant_fields
 from recipes.models import (
     Ingredient,
     Favorite,
+    FeedEntry,
     NumberOfIngredients,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
     Tag
 )
+from recipes.search import refresh_documents
+from recipes.versions import get_ingredient_ids, get_tags
 from users.models import Follow, User
 
 
@@ -21,6 +27,64 @@ NUMBER_OF_INGREDIENTS = ('Минимальное колличество ингр
                          ' меньше 1')
 
 
+def get_recipes_limit(request):
+    """Возвращает значение параметра recipes_limit или None."""
+
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is None or not recipes_limit.isdigit():
+        return None
+    return int(recipes_limit)
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки и размеры уменьшенных копий изображения рецепта."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        variants = {}
+        for variant in IMAGE_VARIANTS:
+            image, width, height = variant_fields(variant)
+            image = getattr(recipe, image)
+            if not image:
+                continue
+            url = image.url
+            variants[variant] = {
+                'url': request.build_absolute_uri(url) if request else url,
+                'width': getattr(recipe, width),
+                'height': getattr(recipe, height),
+            }
+        return variants
+
+
+class SparseFieldsMixin:
+    """Оставляет в сериализаторе только поля из аргумента fields."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CachedTagField(serializers.PrimaryKeyRelatedField):
+    """Поле тэга, которое ищет тэги в кеше вместо запроса к базе."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return get_tags()[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class CreateUserSerializer(UserCreateSerializer):
     """Сериализатор для регистрации пользователей."""
 
@@ -36,7 +100,7 @@ class CreateUserSerializer(UserCreateSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
 
-class UserFollowSerializer(UserSerializer):
+class UserFollowSerializer(SparseFieldsMixin, UserSerializer):
     """Сериализатор для проверки подписок."""
     is_subscribed = serializers.SerializerMethodField()
 
@@ -52,6 +116,8 @@ class UserFollowSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return Follow.objects.filter(
             user=user, author=obj
@@ -120,13 +186,14 @@ class AddIngredientRecipeSerializer(serializers.ModelSerializer):
         return value
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для обработки рецептов."""
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     author = UserFollowSerializer(read_only=True)
     tags = TagSerializer(many=True)
     image = Base64ImageField(use_url=True, )
+    image_variants = ImageVariantsField()
     ingredients = IngredientReadSerializer(
         many=True,
         source='amount_ingredients',
@@ -144,11 +211,19 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
 
+    def to_representation(self, recipe):
+        if hasattr(recipe, 'author_is_subscribed') and recipe.author:
+            recipe.author.is_subscribed = recipe.author_is_subscribed
+        return super().to_representation(recipe)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         return Favorite.objects.filter(
             user=user, recipe=obj
@@ -157,12 +232,21 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         ) else False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         return ShoppingCart.objects.filter(
             user=user, recipe=obj
         ).exists() if user.is_authenticated else False
 
 
+# Карточка рецепта для списков: без описания и ингредиентов.
+RECIPE_CARD_FIELDS = tuple(
+    field for field in RecipeReadSerializer.Meta.fields
+    if field not in ('ingredients', 'text')
+)
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """
     Сериализатор для создания рецептов.
@@ -170,9 +254,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     """
 
     ingredients = AddIngredientRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
+    tags = CachedTagField(queryset=Tag.objects.all(), many=True)
     image = Base64ImageField(use_url=True, )
     cooking_time = serializers.IntegerField()
 
@@ -197,39 +279,72 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return cooking_time
 
     def check_ingredients(self, data):
-        validated_items = []
-        existed = []
-        for item in data:
-            ingredient = get_object_or_404(Ingredient, pk=item['id'])
-            if ingredient in validated_items:
-                existed.append(ingredient)
-            validated_items.append(ingredient)
-        if existed:
+        ids = [item['id'] for item in data]
+        if len(set(ids)) != len(ids):
             raise serializers.ValidationError(
                 'Этот ингредиент уже добавлен'
             )
+        missing = set(ids) - get_ingredient_ids()
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: '
+                f'{", ".join(map(str, sorted(missing)))}'
+            )
 
     def validate(self, data):
         ingredients = data.get('ingredients')
-        self.check_ingredients(ingredients)
-        data['ingredients'] = ingredients
+        if ingredients is not None:
+            self.check_ingredients(ingredients)
         return data
 
     @staticmethod
     def add_ingredients(ingredients, recipe):
-        ingredient_list = []
-        for ingredient in ingredients:
-            amount = ingredient['amount']
-            recipe_ingredient = NumberOfIngredients(
-                ingredients=get_object_or_404(
-                    Ingredient, id=ingredient['id']
-                ),
+        NumberOfIngredients.objects.bulk_create(
+            NumberOfIngredients(
+                ingredients_id=ingredient['id'],
                 recipe=recipe,
-                amount=amount
+                amount=ingredient['amount'],
             )
-            ingredient_list.append(recipe_ingredient)
-        NumberOfIngredients.objects.bulk_create(ingredient_list)
+            for ingredient in ingredients
+        )
 
+    @staticmethod
+    def update_ingredients(ingredients, recipe):
+        """Применяет только изменившиеся количества ингредиентов.
+
+        Возвращает True, если состав рецепта изменился.
+        """
+
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        existing = {
+            row.ingredients_id: row
+            for row in NumberOfIngredients.objects.filter(recipe=recipe)
+        }
+        removed = existing.keys() - amounts.keys()
+        added = [
+            item for item in ingredients if item['id'] not in existing
+        ]
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        if not (removed or added or changed):
+            return False
+        ShoppingListItem.objects.remove_recipe(recipe)
+        if removed:
+            NumberOfIngredients.objects.filter(
+                recipe=recipe, ingredients_id__in=removed
+            ).delete()
+        if changed:
+            NumberOfIngredients.objects.bulk_update(changed, ['amount'])
+        if added:
+            RecipeWriteSerializer.add_ingredients(added, recipe)
+        ShoppingListItem.objects.add_recipe(recipe)
+        return True
+
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
@@ -237,26 +352,34 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(image=image, **validated_data)
         self.add_ingredients(ingredients_data, recipe)
         recipe.tags.set(tags_data)
+        refresh_documents(Recipe.objects.filter(pk=recipe.pk))
+        FeedEntry.objects.fan_out(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        NumberOfIngredients.objects.filter(recipe=recipe).delete()
-        self.add_ingredients(ingredients, recipe)
-        recipe.tags.set(tags)
-        return super().update(recipe, validated_data)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if ingredients is not None:
+            self.update_ingredients(ingredients, recipe)
+        if tags is not None:
+            recipe.tags.set(tags)
+        recipe = super().update(recipe, validated_data)
+        refresh_documents(Recipe.objects.filter(pk=recipe.pk))
+        return recipe
 
     def to_representation(self, recipe):
+        request = self.context.get('request')
         return RecipeReadSerializer(
-            recipe,
-            context={'request': self.context.get('request')}
+            Recipe.objects.for_read(request.user).get(pk=recipe.pk),
+            context={'request': request}
         ).data
 
 
 class RecipeFollowSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения рецепта в подписке."""
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -264,11 +387,21 @@ class RecipeFollowSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time',
         )
 
 
-class FollowSerializer(serializers.ModelSerializer):
+RECIPE_SHORT_FIELDS = (
+    'id',
+    'name',
+    'image',
+    'cooking_time',
+    *VARIANT_FIELDS,
+)
+
+
+class FollowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для подписок."""
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField(read_only=True)
@@ -298,15 +431,32 @@ class FollowSerializer(serializers.ModelSerializer):
         ]
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=obj.author)
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj.author, 'limited_recipes'):
+            recipes = obj.author.limited_recipes
+        else:
+            recipes = Recipe.objects.filter(
+                author=obj.author
+            ).limited_per_author(
+                get_recipes_limit(self.context.get('request'))
+            )
         return RecipeFollowSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(user=obj.user, author=obj.author).exists()
+        return True
+
+
+class IdListSerializer(serializers.Serializer):
+    """Список id для пакетных операций с избранным, корзиной и
+    подписками."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_ITEMS,
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
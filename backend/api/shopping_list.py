@@ -0,0 +1,122 @@
+"""Формирование и потоковая выгрузка списка покупок."""
+
+import csv
+import io
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+from recipes.models import ShoppingListItem
+
+
+SHOPPING_LIST_TITLE = 'Список продуктов к покупке:'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 20 * mm
+PDF_LEADING = 16
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def get_shopping_list(user):
+    """Сводный список ингредиентов из корзины пользователя."""
+
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount',
+    ).order_by('ingredient__name').iterator()
+
+
+def format_row(item):
+    return (
+        f'{item["ingredient__name"]} '
+        f'- {item["amount"]} '
+        f'{item["ingredient__measurement_unit"]}'
+    )
+
+
+def render_txt(rows):
+    yield f'{SHOPPING_LIST_TITLE}\n'.encode('utf-8')
+    for ingredient in rows:
+        yield f'- {format_row(ingredient)}\n'.encode('utf-8')
+
+
+def render_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for ingredient in rows:
+        writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['amount'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+        if buffer.tell() >= STREAM_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def get_pdf_font():
+    """Регистрирует шрифт с кириллицей, если он доступен."""
+
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    if not os.path.exists(settings.SHOPPING_LIST_PDF_FONT):
+        return 'Helvetica'
+    pdfmetrics.registerFont(
+        TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+    )
+    return PDF_FONT_NAME
+
+
+def render_pdf(rows):
+    """Рисует список и отдаёт готовый документ частями.
+
+    В отличие от TXT и CSV, PDF не формируется потоково: reportlab
+    держит все страницы до save() и только тогда пишет документ.
+    Поэтому первый байт отправляется после отрисовки всего списка, а
+    документ хранится во временном файле, который переходит на диск
+    при росте. Длина списка ограничена каталогом: по строке на
+    ингредиент.
+    """
+
+    font = get_pdf_font()
+    _, height = A4
+    with SpooledTemporaryFile(max_size=STREAM_CHUNK_SIZE) as file:
+        canvas = Canvas(file, pagesize=A4, pageCompression=1)
+        canvas.setTitle(SHOPPING_LIST_TITLE.rstrip(':'))
+        canvas.setFont(font, PDF_FONT_SIZE)
+        y = height - PDF_MARGIN
+        canvas.drawString(PDF_MARGIN, y, SHOPPING_LIST_TITLE)
+        for ingredient in rows:
+            y -= PDF_LEADING
+            if y < PDF_MARGIN:
+                canvas.showPage()
+                canvas.setFont(font, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            canvas.drawString(
+                PDF_MARGIN, y, f'• {format_row(ingredient)}'
+            )
+        canvas.save()
+        file.seek(0)
+        while True:
+            chunk = file.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'pdf': render_pdf,
+}
@@ -0,0 +1,33 @@
+"""Обработчики сигналов приложения api."""
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+from .authentication import get_token_cache_key
+
+
+def forget_tokens(keys):
+    keys = [get_token_cache_key(key) for key in keys]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, update_fields, **kwargs):
+    """Смена пароля, блокировка и правка профиля сбрасывают кеш."""
+
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    forget_tokens(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
@@ -0,0 +1,232 @@
+"""Запись медленных SQL-запросов с планами выполнения.
+
+Включается настройкой SLOW_QUERY_THRESHOLD_MS. Запросы дольше порога
+пишутся в ротируемый журнал foodgram.slow_queries и в модель SlowQuery,
+где группируются по нормализованному виду. Для доли
+SLOW_QUERY_EXPLAIN_RATE выборок SELECT выполняется EXPLAIN. EXPLAIN и
+запись выполняются в отдельном потоке, вне обработки запроса.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    close_old_connections,
+    connections,
+    transaction,
+)
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from backend import instrumentation
+
+from .models import SlowQuery
+
+logger = logging.getLogger('foodgram.slow_queries')
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|\?')
+PLACEHOLDER_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+WHITESPACE_RE = re.compile(r'\s+')
+STACK_DEPTH = 8
+
+# Один поток: записи одного вида запроса не соревнуются за строку.
+writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query')
+
+
+def normalize_sql(sql):
+    """Вид запроса без литералов, со свёрнутыми списками IN (...)."""
+
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = PLACEHOLDER_RE.sub('?', sql)
+    sql = PLACEHOLDER_LIST_RE.sub('(...)', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def get_stack():
+    """Кадры кода проекта, из которых выполнен запрос."""
+
+    base = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(base)
+        and 'site-packages' not in frame.filename
+        and frame.filename not in (__file__, instrumentation.__file__)
+    ][-STACK_DEPTH:]
+    return '\n'.join(
+        f'{os.path.relpath(frame.filename, base)}:{frame.lineno} '
+        f'{frame.name}'
+        for frame in frames
+    )
+
+
+class SlowQueryRecorder:
+    """Обёртка execute_wrapper, копящая запросы дольше порога."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.records = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            if duration >= self.threshold:
+                self.records.append({
+                    'sql': sql,
+                    'params': None if many else params,
+                    'many': many,
+                    'database': context['connection'].alias,
+                    'duration': duration,
+                    'stack': get_stack(),
+                })
+
+
+def explain(record):
+    """План выполнения SELECT; для остальных запросов пустая строка."""
+
+    if record['many'] or not record['sql'].lstrip()[:6].upper() == 'SELECT':
+        return ''
+    connection = connections[record['database']]
+    options = {}
+    if (
+        settings.SLOW_QUERY_EXPLAIN_ANALYZE
+        and connection.vendor == 'postgresql'
+    ):
+        options['analyze'] = True
+    prefix = connection.ops.explain_query_prefix(**options)
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {record["sql"]}', record['params'])
+                return '\n'.join(
+                    ' '.join(map(str, row)) for row in cursor.fetchall()
+                )
+    except DatabaseError:
+        logger.exception('EXPLAIN не выполнен')
+        return ''
+
+
+def store(record, normalized, view, plan):
+    """Добавляет выборку к записи SlowQuery её вида запроса."""
+
+    stack = record['stack']
+    fields = {
+        'sql': record['sql'],
+        'params': json.dumps(
+            record['params'], default=str, ensure_ascii=False
+        ),
+        'database': record['database'],
+        'view': view,
+        'stack': stack,
+        'stack_fingerprint': fingerprint(stack) if stack else '',
+        'last_seen': timezone.now(),
+    }
+    if plan:
+        fields['plan'] = plan
+    duration = record['duration']
+    queryset = SlowQuery.objects.filter(fingerprint=fingerprint(normalized))
+    update = {
+        'calls': F('calls') + 1,
+        'total_duration': F('total_duration') + duration,
+        'max_duration': Greatest('max_duration', Value(duration)),
+        **fields,
+    }
+    if queryset.update(**update):
+        return
+    try:
+        with transaction.atomic():
+            SlowQuery.objects.create(
+                fingerprint=fingerprint(normalized),
+                normalized_sql=normalized,
+                calls=1,
+                total_duration=duration,
+                max_duration=duration,
+                **fields,
+            )
+    except IntegrityError:
+        queryset.update(**update)
+
+
+def save_records(records, view):
+    try:
+        for record in records:
+            save_record(record, view)
+    finally:
+        close_old_connections()
+
+
+def save_record(record, view):
+    normalized = normalize_sql(record['sql'])
+    plan = ''
+    if random.random() < settings.SLOW_QUERY_EXPLAIN_RATE:
+        plan = explain(record)
+    logger.warning(json.dumps({
+        'fingerprint': fingerprint(normalized),
+        'duration_ms': round(record['duration'], 3),
+        'database': record['database'],
+        'view': view,
+        'sql': record['sql'],
+        'params': record['params'],
+        'stack': record['stack'],
+        'plan': plan,
+    }, default=str, ensure_ascii=False))
+    try:
+        store(record, normalized, view, plan)
+    except DatabaseError:
+        logger.exception('Медленный запрос не сохранён')
+
+
+class SlowQueryMiddleware:
+    """Подключает SlowQueryRecorder ко всем базам на время запроса.
+
+    Для потоковых ответов обёртка снимается при закрытии ответа, чтобы
+    учитывать запросы тела. Записи передаются потоку writer: EXPLAIN и
+    запись журнала не задерживают ответ, а собственные запросы потока
+    не попадают в выборку.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_THRESHOLD_MS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = SlowQueryRecorder(settings.SLOW_QUERY_THRESHOLD_MS)
+        return instrumentation.get_response_with_wrapper(
+            recorder,
+            self.get_response,
+            request,
+            partial(self.finish, request, recorder),
+        )
+
+    @staticmethod
+    def finish(request, recorder, response):
+        if recorder.records:
+            match = request.resolver_match
+            writer.submit(
+                save_records,
+                recorder.records,
+                match.view_name if match else '',
+            )
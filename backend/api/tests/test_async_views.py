@@ -0,0 +1,87 @@
+"""Замеры запросов асинхронных маршрутов ASGI-режима."""
+
+import re
+
+from asgiref.sync import async_to_sync
+from django.test import (
+    AsyncClient,
+    Client,
+    TransactionTestCase,
+    override_settings,
+)
+
+from api import slow_queries
+from api.models import SlowQuery
+from recipes.models import Recipe, Tag
+from users.models import User
+
+QUERIES_RE = re.compile(r'sql;dur=[\d.]+;desc="(\d+) queries"')
+RENDER_RE = re.compile(r'render;dur=([\d.]+)')
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+@override_settings(CACHES=NO_CACHE, REQUEST_METRICS=True)
+class AsyncInstrumentationTest(TransactionTestCase):
+    """Обёртки middleware подключаются в потоках асинхронных маршрутов.
+
+    TransactionTestCase: представления выполняются в пуле потоков со
+    своими соединениями и должны видеть сохранённые данные.
+    """
+
+    def setUp(self):
+        author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание', cooking_time=5,
+            image='recipe/async.png',
+        )
+        recipe.tags.add(
+            Tag.objects.create(name='Завтрак', color='#E26C2D', slug='b')
+        )
+
+    def get(self, path, urlconf='backend.urls_async'):
+        async def get_async():
+            return await AsyncClient().get(path)
+
+        with override_settings(ROOT_URLCONF=urlconf):
+            if urlconf == 'backend.urls_async':
+                return async_to_sync(get_async)()
+            return Client().get(path)
+
+    def get_queries(self, response):
+        header = response['Server-Timing']
+        return int(QUERIES_RE.search(header).group(1))
+
+    def test_async_routes_count_queries(self):
+        for path in ('/api/recipes/', '/api/recipes/?tags=b', '/api/tags/'):
+            with self.subTest(path=path):
+                response = self.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(self.get_queries(response), 0)
+                self.assertEqual(
+                    self.get_queries(response),
+                    self.get_queries(self.get(path, 'backend.urls')),
+                )
+
+    def test_async_routes_time_rendering(self):
+        response = self.get('/api/recipes/?limit=100')
+        render = RENDER_RE.search(response['Server-Timing']).group(1)
+        self.assertGreater(float(render), 0)
+
+    @override_settings(
+        REQUEST_METRICS=False,
+        SLOW_QUERY_THRESHOLD_MS=1e-6,
+        SLOW_QUERY_EXPLAIN_RATE=0,
+    )
+    def test_async_routes_record_slow_queries(self):
+        with self.assertLogs(slow_queries.logger, 'WARNING'):
+            self.assertEqual(self.get('/api/recipes/').status_code, 200)
+            # Записи сохраняет поток writer: дожидаемся его очереди.
+            slow_queries.writer.submit(lambda: None).result()
+        self.assertIn(
+            'api:recipes-list',
+            SlowQuery.objects.values_list('view', flat=True),
+        )
@@ -0,0 +1,210 @@
+"""Совпадение ответов COMPILED_READ с сериализаторами DRF."""
+
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.serializers import CommonIngredientSerializer, RecipeReadSerializer
+from recipes.models import (
+    FeedEntry,
+    Favorite,
+    Ingredient,
+    NumberOfIngredients,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.search import refresh_documents
+from users.models import Follow, User
+
+RECIPES_URL = reverse('api:recipes-list')
+FEED_URL = reverse('api:recipes-feed')
+INGREDIENTS_URL = reverse('api:ingredients-list')
+FULL_FIELDS = ','.join(RecipeReadSerializer.Meta.fields)
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+@override_settings(CACHES=NO_CACHE, INGREDIENT_PREFIX_INDEX=False)
+class CompiledReadTest(TestCase):
+    """Ответы compiled-пути совпадают с сериализаторами байт в байт."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        authors = [
+            User.objects.create(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                first_name=f'Автор {number}',
+                last_name=None if number % 2 else 'Фамилия',
+            )
+            for number in range(3)
+        ]
+        tags = [
+            Tag.objects.create(
+                name=f'Тэг {number}', color=f'#00000{number}',
+                slug=f'tag{number}',
+            )
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+        started = timezone.now()
+        for number in range(7):
+            variants = {}
+            if number % 3:
+                variants = {
+                    'image_thumbnail': f'recipe/thumbnail/{number}.webp',
+                    'image_thumbnail_width': 320,
+                    'image_thumbnail_height': 240,
+                }
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}',
+                text=f'Описание рецепта {number}.',
+                cooking_time=number + 1,
+                image=f'recipe/{number}.png',
+                **variants,
+            )
+            recipe.tags.set(tags[:number % len(tags) + 1])
+            NumberOfIngredients.objects.bulk_create([
+                NumberOfIngredients(
+                    recipe=recipe, ingredients=ingredient, amount=number + 1
+                )
+                for ingredient in ingredients[number % 2::2]
+            ])
+            # Одинаковые даты у соседних рецептов проверяют порядок по id
+            # на границе страниц курсора.
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=started - timedelta(minutes=number // 2)
+            )
+        refresh_documents(Recipe.objects.all())
+        recipes = list(Recipe.objects.order_by('pk'))
+        Favorite.objects.create(user=cls.user, recipe=recipes[0])
+        Favorite.objects.create(user=cls.user, recipe=recipes[3])
+        ShoppingCart.objects.create(user=cls.user, recipe=recipes[1])
+        for author in authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+        User.objects.filter(pk__in=[author.pk for author in authors]).update(
+            followers_count=1
+        )
+        FeedEntry.objects.backfill([author.pk for author in authors])
+
+    def setUp(self):
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+        self.clients = {
+            'аноним': APIClient(),
+            'пользователь': self.authorized_client,
+        }
+
+    def get_pair(self, client, url):
+        """Ответы сериализаторов и compiled-пути на url.
+
+        Сериализаторы рецептов и ингредиентов в compiled-пути
+        вызываться не должны.
+        """
+
+        with override_settings(COMPILED_READ=False):
+            expected = client.get(url)
+        with override_settings(COMPILED_READ=True), mock.patch.object(
+            RecipeReadSerializer, 'to_representation',
+            side_effect=AssertionError('вызван RecipeReadSerializer'),
+        ), mock.patch.object(
+            CommonIngredientSerializer, 'to_representation',
+            side_effect=AssertionError('вызван CommonIngredientSerializer'),
+        ):
+            actual = client.get(url)
+        return expected, actual
+
+    def assert_pages_match(self, client, url):
+        """Сравнивает все страницы, начиная с url; возвращает их число."""
+
+        pages = 0
+        while url:
+            expected, actual = self.get_pair(client, url)
+            self.assertEqual(expected.status_code, 200, url)
+            self.assertEqual(actual.status_code, 200, url)
+            self.assertEqual(actual.content, expected.content, url)
+            pages += 1
+            data = expected.json()
+            url = data.get('next') if isinstance(data, dict) else None
+        return pages
+
+    def test_recipe_lists_match(self):
+        queries = (
+            {},
+            {'fields': FULL_FIELDS},
+            {'fields': 'id,name,ingredients'},
+            {'omit': 'author,image_variants'},
+            {'fields': FULL_FIELDS, 'omit': 'text'},
+            {'tags': 'tag1'},
+            {'search': 'Рецепт'},
+            {'ordering': '-cooking_time'},
+            {'is_favorited': 1, 'fields': FULL_FIELDS},
+            {'is_in_shopping_cart': 1},
+        )
+        for name, client in self.clients.items():
+            for params in queries:
+                with self.subTest(client=name, params=params):
+                    self.assert_pages_match(
+                        client, f'{RECIPES_URL}?{urlencode(params)}'
+                    )
+
+    def test_cursor_pages_match(self):
+        for name, client in self.clients.items():
+            for params in (
+                {'cursor': '', 'limit': 2},
+                {'cursor': '', 'limit': 3, 'fields': FULL_FIELDS},
+                {'cursor': '', 'limit': 2, 'tags': 'tag0'},
+            ):
+                with self.subTest(client=name, params=params):
+                    pages = self.assert_pages_match(
+                        client, f'{RECIPES_URL}?{urlencode(params)}'
+                    )
+                    self.assertGreater(pages, 1)
+
+    def test_feed_pages_match(self):
+        for threshold in (1000, 0):
+            for params in (
+                {'limit': 2},
+                {'limit': 2, 'fields': FULL_FIELDS},
+                {'limit': 3, 'omit': 'tags'},
+            ):
+                with self.subTest(threshold=threshold, params=params):
+                    with override_settings(
+                        FEED_FANOUT_MAX_FOLLOWERS=threshold
+                    ):
+                        pages = self.assert_pages_match(
+                            self.authorized_client,
+                            f'{FEED_URL}?{urlencode(params)}',
+                        )
+                    self.assertGreater(pages, 1)
+
+    def test_ingredient_lists_match(self):
+        for params in ({}, {'name': 'ингр'}):
+            with self.subTest(params=params):
+                self.assert_pages_match(
+                    self.clients['аноним'],
+                    f'{INGREDIENTS_URL}?{urlencode(params)}',
+                )
+
+    def test_unknown_field_rejected_on_both_paths(self):
+        expected, actual = self.get_pair(
+            self.clients['аноним'], f'{RECIPES_URL}?fields=id,unknown'
+        )
+        self.assertEqual(expected.status_code, 400)
+        self.assertEqual(actual.content, expected.content)
@@ -0,0 +1,95 @@
+"""Заполнение лент подписок при публикации и отписке."""
+
+from unittest import mock
+
+from django.db.models import F
+from django.shortcuts import get_object_or_404
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import FeedEntry, Recipe
+from users.models import User
+
+
+class FeedEntryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        cls.readers = [
+            User.objects.create(
+                username=f'reader{number}',
+                email=f'reader{number}@example.com',
+            )
+            for number in range(3)
+        ]
+
+    def create_recipe(self, name, pub_date=None):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, text=name, cooking_time=1,
+            image='recipe/feed.png',
+        )
+        if pub_date is not None:
+            Recipe.objects.filter(pk=recipe.pk).update(pub_date=pub_date)
+            recipe.refresh_from_db()
+        return recipe
+
+    def subscribe(self, reader, method='post'):
+        client = APIClient()
+        client.force_authenticate(reader)
+        response = getattr(client, method)(reverse(
+            'api:users-subscribe', args=(self.author.pk,)
+        ))
+        self.assertLess(response.status_code, 300)
+
+    def get_feed(self, reader):
+        return list(FeedEntry.objects.filter(user=reader).order_by(
+            '-pub_date', '-recipe_id'
+        ).values_list('recipe_id', flat=True))
+
+    @override_settings(FEED_MAX_ENTRIES=2)
+    def test_fan_out_trims_in_feed_order(self):
+        same_time = timezone.now()
+        recipes = [
+            self.create_recipe(f'Рецепт {number}', same_time)
+            for number in range(2)
+        ]
+        for reader in self.readers:
+            self.subscribe(reader)
+        # Записи с одинаковой датой идут в индексе по возрастанию id,
+        # а в ленте — по убыванию id рецепта.
+        FeedEntry.objects.all().delete()
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user=reader, recipe=recipe, pub_date=same_time)
+            for reader in self.readers
+            for recipe in recipes
+        ])
+        new = self.create_recipe('Новый')
+        self.author.refresh_from_db()
+        FeedEntry.objects.fan_out(new)
+        for reader in self.readers:
+            self.assertEqual(self.get_feed(reader), [new.pk, recipes[1].pk])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_concurrent_unfollow_backfills_feed(self):
+        recipe = self.create_recipe('Рецепт')
+        for reader in self.readers:
+            self.subscribe(reader)
+        FeedEntry.objects.all().delete()
+
+        def get_author(*args, **kwargs):
+            author = get_object_or_404(*args, **kwargs)
+            # Другая отписка завершается между чтением автора и
+            # обновлением счётчика.
+            User.objects.filter(pk=author.pk).update(
+                followers_count=F('followers_count') - 1
+            )
+            return author
+
+        with mock.patch('api.views.get_object_or_404', get_author):
+            self.subscribe(self.readers[2], method='delete')
+        self.assertEqual(self.get_feed(self.readers[0]), [recipe.pk])
@@ -1,7 +1,13 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, TagViewSet, UsersViewSet, RecipeViewSet
+from .views import (
+    IngredientViewSet,
+    MetricsView,
+    RecipeViewSet,
+    TagViewSet,
+    UsersViewSet,
+)
 
 app_name = 'api'
 
@@ -13,6 +19,7 @@ router_v1.register('recipes', RecipeViewSet, basename='recipes')
 
 
 urlpatterns = [
+    re_path(r'^metrics/?$', MetricsView.as_view(), name='metrics'),
     path('', include(router_v1.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -2,125 +2,496 @@
 
 from http import HTTPStatus
 
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Value
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    AllowAny,
+    IsAdminUser,
+    IsAuthenticated,
+)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import LimitPageNumberPagination
-from .permissions import AdminOrAuthor, AdminOrReadOnly
+from recipes.counters import recount
 from recipes.models import (
+    Favorite,
+    FeedEntry,
     Ingredient,
-    Tag,
     Recipe,
-    Favorite,
     ShoppingCart,
-    NumberOfIngredients
+    ShoppingListItem,
+    Tag,
+)
+from recipes.search import rank_ingredients
+from recipes.transfer import NDJSON_CONTENT_TYPE, export_lines
+from recipes.versions import get_version
+from users.models import FOLLOW_TO_YOURSELF, Follow, User
+
+from backend.instrumentation import metrics
+
+from . import shopping_list
+from .cache import VersionedCacheMixin
+from .compiled import (
+    CompiledListMixin,
+    compile_recipes,
+    ingredient_values,
+    recipe_values,
+)
+from .conditional import (
+    ConditionalGetMixin,
+    VersionedConditionalGetMixin,
+    make_etag,
+)
+from .fieldsets import SparseFieldsetMixin
+from .filters import IngredientFilter, RecipeFilter
+from .ingredient_index import ingredient_index
+from .pagination import KeysetPaginationMixin, LimitPageNumberPagination
+from .permissions import AdminOrAuthor, AdminOrReadOnly
+from .renderers import (
+    CSVRenderer,
+    FormatContentNegotiation,
+    PDFRenderer,
+    TxtRenderer,
 )
 from .serializers import (
     CommonIngredientSerializer,
     FollowSerializer,
+    IdListSerializer,
+    RECIPE_CARD_FIELDS,
+    RECIPE_SHORT_FIELDS,
     RecipeFollowSerializer,
     RecipeReadSerializer,
     RecipeWriteSerializer,
     TagSerializer,
     UserFollowSerializer,
+    get_recipes_limit,
 )
-from users.models import User, Follow
 
 
-SHOPPING_LIST_NAME = 'shopping_list.txt'
+SHOPPING_LIST_NAME = 'shopping_list'
+EXPORT_NAME = 'recipes'
+NOT_FOUND_IDS = 'Объекты не найдены: {ids}'
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
 
+def get_batch_ids(request):
+    serializer = IdListSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['ids']
 
-class UsersViewSet(UserViewSet):
+
+def check_found(ids, found):
+    """Отклоняет пакет, если часть id не найдена."""
+
+    missing = set(ids) - set(found)
+    if missing:
+        raise ValidationError({'ids': [NOT_FOUND_IDS.format(
+            ids=', '.join(map(str, sorted(missing)))
+        )]})
+
+
+def get_search_limit(request):
+    """Значение параметра limit, не больше INGREDIENT_SEARCH_LIMIT."""
+
+    limit = request.query_params.get('limit', '')
+    if not limit.isdigit():
+        return settings.INGREDIENT_SEARCH_LIMIT
+    return max(1, min(int(limit), settings.INGREDIENT_SEARCH_LIMIT))
+
+
+class UsersViewSet(SparseFieldsetMixin, KeysetPaginationMixin, UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserFollowSerializer
     search_fields = ('username', 'email')
     permission_classes = (AllowAny,)
+    keyset_ordering = ('id',)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        fields = (
+            self.get_response_fields() or UserFollowSerializer.Meta.fields
+        )
+        if 'is_subscribed' in fields:
+            user = self.request.user
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            ) if user.is_authenticated else Value(False))
+        return queryset.only(
+            'id', *(field for field in fields if field != 'is_subscribed')
+        )
 
     @action(
         methods=['GET'],
         detail=False,
-        permission_classes=(IsAuthenticated, )
+        permission_classes=(IsAuthenticated, ),
+        keyset_ordering=('author_id',),
     )
     def subscriptions(self, request):
-        queryset = Follow.objects.filter(user=request.user)
-        page = self.paginate_queryset(queryset)
+        fields = self.get_response_fields(FollowSerializer)
+        page = self.paginate_queryset(self.get_follows(
+            request, recipes=fields is None or 'recipes' in fields
+        ))
         serializer = FollowSerializer(
-            page, many=True, context={'request': request}
+            page, many=True, context={'request': request}, fields=fields
         )
         return self.get_paginated_response(serializer.data)
 
+    @staticmethod
+    def get_follows(request, recipes=True):
+        follows = Follow.objects.filter(
+            user=request.user
+        ).select_related('author').order_by('author')
+        if not recipes:
+            return follows
+        return follows.prefetch_related(
+            Prefetch(
+                'author__recipes',
+                queryset=Recipe.objects.only(
+                    *RECIPE_SHORT_FIELDS, 'author'
+                ).limited_per_author(get_recipes_limit(request)),
+                to_attr='limited_recipes',
+            )
+        )
+
     @action(
         methods=['POST', 'DELETE'],
         detail=True,
+        permission_classes=(IsAuthenticated, ),
     )
     def subscribe(self, request, id):
         author = get_object_or_404(User, id=id)
         if request.method == 'POST':
+            if request.user.pk == author.pk:
+                raise ValidationError({'errors': [FOLLOW_TO_YOURSELF]})
+            follow = Follow(user=request.user, author=author)
+            try:
+                with transaction.atomic():
+                    follow.save()
+                    User.objects.filter(pk=author.pk).update(
+                        followers_count=F('followers_count') + 1
+                    )
+                    FeedEntry.objects.backfill([author.pk], request.user)
+            except IntegrityError:
+                # Повторная подписка: ответ тот же, данные не меняются.
+                response_status = status.HTTP_200_OK
+            else:
+                response_status = status.HTTP_201_CREATED
             serializer = FollowSerializer(
-                Follow.objects.create(
-                    user=request.user,
-                    author=author
-                ), context={'request': request},
-            )
-            return Response(
-                serializer.data, status=status.HTTP_201_CREATED
+                follow, context={'request': request},
             )
-        Follow.objects.filter(user=request.user, author=author).delete()
+            return Response(serializer.data, status=response_status)
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(
+                user=request.user, author=author
+            ).delete()
+            if deleted:
+                User.objects.filter(pk=author.pk).update(
+                    followers_count=F('followers_count') - 1
+                )
+                FeedEntry.objects.prune([author.pk], request.user)
+                FeedEntry.objects.backfill_returned([author.pk])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='subscribe',
+        url_name='subscribe-batch',
+        permission_classes=(IsAuthenticated, ),
+    )
+    def subscribe_batch(self, request):
+        """Подписка на авторов из списка ids или отписка от них."""
 
-class TagViewSet(viewsets.ModelViewSet):
+        ids = get_batch_ids(request)
+        if request.method == 'DELETE':
+            self.unfollow_batch(request.user, ids)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if request.user.pk in ids:
+            raise ValidationError({'ids': [FOLLOW_TO_YOURSELF]})
+        check_found(
+            ids, User.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        with transaction.atomic():
+            Follow.objects.bulk_create(
+                [Follow(user=request.user, author_id=pk) for pk in ids],
+                ignore_conflicts=True,
+            )
+            recount(User.objects.filter(pk__in=ids))
+            FeedEntry.objects.backfill(ids, request.user)
+        serializer = FollowSerializer(
+            self.get_follows(request).filter(author__in=ids),
+            many=True,
+            context={'request': request},
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    @transaction.atomic
+    def unfollow_batch(user, ids):
+        deleted, _ = Follow.objects.filter(user=user, author__in=ids).delete()
+        if not deleted:
+            return
+        recount(User.objects.filter(pk__in=ids))
+        FeedEntry.objects.prune(ids, user)
+        # Авторы, вернувшиеся под порог, снова раскладываются по лентам;
+        # их рецепты, опубликованные выше порога, догружаются.
+        FeedEntry.objects.backfill_returned(ids)
+
+
+class TagViewSet(
+    VersionedConditionalGetMixin, VersionedCacheMixin, viewsets.ModelViewSet
+):
     queryset = Tag.objects.all()
     pagination_class = None
     serializer_class = TagSerializer
     permission_classes = (AdminOrReadOnly,)
+    version_models = (Tag,)
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(
+    VersionedConditionalGetMixin,
+    VersionedCacheMixin,
+    CompiledListMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Ingredient.objects.all()
     serializer_class = CommonIngredientSerializer
     pagination_class = None
     permission_classes = (AdminOrReadOnly, )
     filter_backends = (DjangoFilterBackend, filters.SearchFilter, )
     filterset_class = IngredientFilter
+    version_models = (Ingredient,)
 
+    def get_compiled_rows(self, queryset):
+        return ingredient_values(queryset)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        if 'search' in request.query_params:
+            return self.conditional_response(
+                self.list_ranked, request, *args, **kwargs
+            )
+        if not settings.INGREDIENT_PREFIX_INDEX:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            self.list_from_index, request, *args, **kwargs
+        )
+
+    def list_from_index(self, request, *args, **kwargs):
+        return Response(
+            ingredient_index.search(request.query_params.get('name', ''))
+        )
+
+    def list_ranked(self, request, *args, **kwargs):
+        """Топ похожих ингредиентов по триграммам, не больше лимита."""
+
+        query = request.query_params['search'].strip()
+        limit = get_search_limit(request)
+        if not query:
+            return Response([])
+        queryset = self.get_queryset()
+        if connections[queryset.db].vendor != 'postgresql':
+            return Response(ingredient_index.rank(query, limit))
+        queryset = rank_ingredients(queryset, query)[:limit]
+        return Response(self.get_serializer(queryset, many=True).data)
+
+
+class RecipeViewSet(
+    SparseFieldsetMixin,
+    CompiledListMixin,
+    ConditionalGetMixin,
+    KeysetPaginationMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Recipe.objects.all()
     permission_classes = (AdminOrAuthor, )
     pagination_class = LimitPageNumberPagination
-    filter_backends = (DjangoFilterBackend, )
+    keyset_ordering = ('-pub_date', '-id')
+    vary_headers = ('Authorization',)
+    filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
+    default_fields = {
+        'list': RECIPE_CARD_FIELDS,
+        'feed': RECIPE_CARD_FIELDS,
+    }
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.for_read(
+                self.request.user, self.get_response_fields()
+            )
+        return Recipe.objects.all()
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def get_read_fields(self):
+        return (
+            self.get_response_fields() or RecipeReadSerializer.Meta.fields
+        )
+
+    def get_compiled_rows(self, queryset):
+        return recipe_values(queryset, self.get_read_fields())
+
+    def compile_rows(self, rows):
+        return compile_recipes(rows, self.get_read_fields(), self.request)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_validators(self, request, *args, **kwargs):
+        """ETag учитывает флаги пользователя и данные автора.
+
+        Last-Modified отдаётся только анонимам: изменения избранного,
+        корзины и подписок пользователя не отражаются на времени
+        изменения рецепта.
+        """
+
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if not str(pk).isdigit():
+            return None, None
+        recipe = Recipe.objects.with_user_flags(request.user).filter(
+            pk=pk
+        ).values(
+            'pk',
+            'updated_at',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'author_is_subscribed',
+            'author__email',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+        ).first()
+        if recipe is None:
+            return None, None
+        tags_version, tags_updated_at = get_version(Tag)
+        ingredients_version, ingredients_updated_at = get_version(Ingredient)
+        etag = make_etag(
+            request.user.pk,
+            self.get_response_fields(),
+            tags_version,
+            ingredients_version,
+            *recipe.values(),
+        )
+        if request.user.is_authenticated:
+            return etag, None
+        return etag, max(
+            recipe['updated_at'], tags_updated_at, ingredients_updated_at
+        )
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     @staticmethod
     def __add_recipe(model, request, pk):
         recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(recipe=recipe, user=request.user)
         serializer = RecipeFollowSerializer(recipe)
+        try:
+            with transaction.atomic():
+                model.objects.create(recipe=recipe, user=request.user)
+                if model in RECIPE_COUNTERS:
+                    counter = RECIPE_COUNTERS[model]
+                    Recipe.objects.filter(pk=recipe.pk).update(
+                        **{counter: F(counter) + 1}
+                    )
+                if model is ShoppingCart:
+                    ShoppingListItem.objects.add_recipe(recipe, request.user)
+        except IntegrityError:
+            # Рецепт уже добавлен: повторный запрос ничего не меняет.
+            return Response(data=serializer.data, status=HTTPStatus.OK)
         return Response(data=serializer.data, status=HTTPStatus.CREATED)
 
     @staticmethod
+    @transaction.atomic
     def __delete_recipe(model, request, pk):
         recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.filter(recipe=recipe, user=request.user).delete()
+        if model is ShoppingCart:
+            ShoppingListItem.objects.remove_recipe(recipe, request.user)
+        deleted, _ = model.objects.filter(
+            recipe=recipe, user=request.user
+        ).delete()
+        if deleted and model in RECIPE_COUNTERS:
+            counter = RECIPE_COUNTERS[model]
+            Recipe.objects.filter(pk=recipe.pk).update(
+                **{counter: F(counter) - 1}
+            )
         return Response(status=HTTPStatus.NO_CONTENT)
 
+    @staticmethod
+    def __change_recipes(model, request):
+        """Пакетно добавляет рецепты из списка ids или удаляет их.
+
+        Число запросов не зависит от длины списка: уже добавленные
+        рецепты пропускаются, счётчики пересчитываются одним UPDATE, а
+        список покупок пересобирается целиком.
+        """
+
+        ids = get_batch_ids(request)
+        user = request.user
+        if request.method == 'DELETE':
+            with transaction.atomic():
+                deleted, _ = model.objects.filter(
+                    user=user, recipe__in=ids
+                ).delete()
+                if deleted:
+                    recount(Recipe.objects.filter(pk__in=ids))
+                    if model is ShoppingCart:
+                        ShoppingListItem.objects.rebuild(user)
+            return Response(status=HTTPStatus.NO_CONTENT)
+        recipes = list(
+            Recipe.objects.filter(pk__in=ids).only(*RECIPE_SHORT_FIELDS)
+        )
+        check_found(ids, [recipe.pk for recipe in recipes])
+        with transaction.atomic():
+            model.objects.bulk_create(
+                [model(user=user, recipe=recipe) for recipe in recipes],
+                ignore_conflicts=True,
+            )
+            recount(Recipe.objects.filter(pk__in=ids))
+            if model is ShoppingCart:
+                ShoppingListItem.objects.rebuild(user)
+        serializer = RecipeFollowSerializer(recipes, many=True)
+        return Response(data=serializer.data, status=HTTPStatus.CREATED)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        url_name='favorite-batch',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_batch(self, request):
+        return self.__change_recipes(Favorite, request)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_batch(self, request):
+        return self.__change_recipes(ShoppingCart, request)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -154,32 +525,81 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['GET'],
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        keyset_required=True,
+    )
+    def feed(self, request):
+        """Новые рецепты авторов из подписок пользователя.
+
+        Лента выводится только по курсору: каждая страница читает из
+        ленты и из рецептов крупных авторов не больше страницы записей.
+        """
+
+        paginator = self.paginator
+        queryset = self.filter_queryset(self.get_queryset()).feed(
+            request.user,
+            paginator.decode_cursor(request, Recipe),
+            paginator.get_page_size(request) + 1,
+        )
+        if settings.COMPILED_READ:
+            return self.compiled_list(queryset)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAdminUser,),
+    )
+    def export(self, request):
+        """Потоковая выгрузка отфильтрованных рецептов в NDJSON."""
+
+        response = StreamingHttpResponse(
+            export_lines(self.filter_queryset(Recipe.objects.all())),
+            content_type=NDJSON_CONTENT_TYPE,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename={EXPORT_NAME}.ndjson'
+        )
+        return response
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(TxtRenderer, CSVRenderer, PDFRenderer),
+        content_negotiation_class=FormatContentNegotiation,
     )
     def download_shopping_cart(self, request):
         user = request.user
         if not user.shopping_cart.exists():
             return Response(status=HTTPStatus.BAD_REQUEST)
-        ingredients = NumberOfIngredients.objects.filter(
-            recipe__shopping_cart__user=user
-        ).values(
-            'ingredients__name',
-            'ingredients__measurement_unit',
-        ).annotate(
-            value=Sum('amount')
-        ).order_by('ingredients__name')
-        response = HttpResponse(
-            content_type='text/plain',
-            charset='utf-8',
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            shopping_list.RENDERERS[renderer.format](
+                shopping_list.get_shopping_list(user)
+            ),
+            content_type=content_type,
         )
         response['Content-Disposition'] = (
-            f'attachment; filename={SHOPPING_LIST_NAME}'
-        )
-        response.write('Список продуктов к покупке:\n')
-        for ingredient in ingredients:
-            response.write(
-                f'- {ingredient["ingredients__name"]} '
-                f'- {ingredient["value"]} '
-                f'{ingredient["ingredients__measurement_unit"]}\n'
-            )
+            f'attachment; filename={SHOPPING_LIST_NAME}.{renderer.format}'
+        )
         return response
+
+
+class MetricsView(APIView):
+    """Метрики запросов в текстовом формате Prometheus."""
+
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request):
+        if not settings.REQUEST_METRICS:
+            raise Http404
+        return HttpResponse(
+            metrics.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
@@ -0,0 +1,92 @@
+"""Чтение с реплик и закрепление клиента за основной базой после записи.
+
+Реплики задаются переменной окружения DB_REPLICAS. ReplicaMiddleware
+выбирает реплику для запросов безопасными методами, ReplicaRouter
+направляет на неё чтение, а запись и всё остальное — в default.
+
+После успешного запроса на изменение ответ несёт cookie и заголовок
+X-Primary-Pin с моментом окончания закрепления. Пока он не наступил,
+чтения клиента, вернувшего cookie или заголовок, идут в основную базу,
+поэтому клиент сразу видит свои изменения, несмотря на отставание реплик.
+"""
+
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = 'primary_pin'
+PIN_HEADER = 'X-Primary-Pin'
+# Модели, которые всегда читаются из основной базы: свежий токен должен
+# работать сразу после входа, а устаревшая версия таблицы с реплики
+# закешировала бы старые ETag и справочники до следующего изменения.
+PRIMARY_MODELS = ('authtoken.token', 'recipes.dataversion')
+
+read_alias = ContextVar('read_alias', default=None)
+
+
+class ReplicaRouter:
+    """Чтение с выбранной для запроса реплики, запись в default."""
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if alias is None or model._meta.label_lower in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def get_pin(request):
+    """Момент окончания закрепления из cookie или заголовка запроса."""
+
+    value = request.COOKIES.get(PIN_COOKIE) or request.headers.get(PIN_HEADER)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class ReplicaMiddleware:
+    """Выбирает базу для чтения и закрепляет клиента после записи."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        alias = None
+        if request.method in SAFE_METHODS and get_pin(request) < time.time():
+            alias = random.choice(settings.DATABASE_REPLICAS)
+        token = read_alias.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            self.pin(response)
+        return response
+
+    @staticmethod
+    def pin(response):
+        until = int(time.time()) + settings.REPLICA_PIN_SECONDS
+        response.set_cookie(
+            PIN_COOKIE,
+            str(until),
+            max_age=settings.REPLICA_PIN_SECONDS,
+            httponly=True,
+            samesite='Lax',
+        )
+        response[PIN_HEADER] = str(until)
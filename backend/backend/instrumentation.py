@@ -0,0 +1,297 @@
+"""Замеры времени запросов: заголовок Server-Timing и метрики Prometheus.
+
+Включается настройкой REQUEST_METRICS. Гистограммы хранятся в памяти
+процесса: при нескольких воркерах gunicorn каждый отдаёт свои значения,
+которые Prometheus различает по метке instance.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERIES_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+METRICS = (
+    ('request_seconds', 'Полное время обработки запроса', SECONDS_BUCKETS),
+    ('view_seconds', 'Время выполнения представления', SECONDS_BUCKETS),
+    ('render_seconds', 'Время рендеринга ответа', SECONDS_BUCKETS),
+    ('sql_seconds', 'Суммарное время SQL-запросов', SECONDS_BUCKETS),
+    ('sql_queries', 'Количество SQL-запросов', QUERIES_BUCKETS),
+)
+METRIC_PREFIX = 'foodgram_'
+
+
+class Histogram:
+    """Кумулятивная гистограмма в формате Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield str(bound), cumulative
+        yield '+Inf', self.count
+
+
+class MetricsRegistry:
+    """Гистограммы по маршрутам и методам плюс счётчик ответов."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name, _, _ in METRICS}
+        self._responses = {}
+
+    def observe(self, route, method, status, values):
+        labels = (route, method)
+        with self._lock:
+            for name, _, buckets in METRICS:
+                histograms = self._histograms[name]
+                if labels not in histograms:
+                    histograms[labels] = Histogram(buckets)
+                histograms[labels].observe(values[name])
+            key = labels + (status,)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus 0.0.4."""
+
+        lines = []
+        with self._lock:
+            for name, description, _ in METRICS:
+                metric = METRIC_PREFIX + name
+                lines.append(f'# HELP {metric} {description}')
+                lines.append(f'# TYPE {metric} histogram')
+                for (route, method), histogram in sorted(
+                    self._histograms[name].items()
+                ):
+                    labels = f'route="{route}",method="{method}"'
+                    for bound, count in histogram.samples():
+                        lines.append(
+                            f'{metric}_bucket{{{labels},le="{bound}"}} {count}'
+                        )
+                    lines.append(f'{metric}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(
+                        f'{metric}_count{{{labels}}} {histogram.count}'
+                    )
+            metric = METRIC_PREFIX + 'responses_total'
+            lines.append(f'# HELP {metric} Количество ответов по статусам')
+            lines.append(f'# TYPE {metric} counter')
+            for (route, method, status), count in sorted(
+                self._responses.items()
+            ):
+                lines.append(
+                    f'{metric}{{route="{route}",method="{method}",'
+                    f'status="{status}"}} {count}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+class ClosingIterator:
+    """Тело потокового ответа, вызывающее on_close при закрытии ответа.
+
+    StreamingHttpResponse вызывает close() у итерируемого тела из
+    HttpResponse.close(), который сервер вызывает после отправки или
+    обрыва соединения, даже если тело так и не начали перебирать.
+    """
+
+    def __init__(self, iterable, on_close):
+        self.iterator = iter(iterable)
+        self.on_close = on_close
+
+    def __iter__(self):
+        return self.iterator
+
+    def close(self):
+        self.on_close()
+
+
+def get_response_with_wrapper(wrapper, get_response, request, on_finish):
+    """Ответ на request с wrapper на execute_wrapper всех соединений.
+
+    Тело потокового ответа формируется уже после выхода из middleware,
+    поэтому для него обёртка снимается только при закрытии ответа.
+    on_finish(response) вызывается после снятия обёртки. Соединения
+    Django у каждого потока свои: wrapper запоминается в request, и код,
+    выполняющий представление в другом потоке, подключает его через
+    request_wrappers().
+    """
+
+    request._execute_wrappers = (
+        *getattr(request, '_execute_wrappers', ()), wrapper
+    )
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        response = get_response(request)
+        if response.streaming:
+            close = stack.pop_all().close
+
+            def finish():
+                close()
+                on_finish(response)
+
+            response.streaming_content = ClosingIterator(
+                response.streaming_content, finish
+            )
+            return response
+    on_finish(response)
+    return response
+
+
+@contextmanager
+def request_wrappers(request):
+    """Обёртки middleware запроса на соединениях текущего потока."""
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            for wrapper in getattr(request, '_execute_wrappers', ()):
+                if wrapper not in connection.execute_wrappers:
+                    stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+def render_response(request, response):
+    """Рендерит ответ с отложенным рендерингом вне цепочки middleware.
+
+    Граница представления и рендеринга отмечается в замерах запроса,
+    как это делает ServerTimingMiddleware для обычных ответов.
+    """
+
+    timing = getattr(request, '_timing', None)
+    if timing is not None:
+        timing.view_end = time.perf_counter()
+    response = response.render()
+    if timing is not None:
+        timing.render_end = time.perf_counter()
+    return response
+
+
+class QueryTimer:
+    """Обёртка execute_wrapper, считающая запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestTiming:
+    """Отметки времени одного запроса."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view_start = None
+        self.view_end = None
+        self.render_end = None
+        self.queries = QueryTimer()
+
+
+class ServerTimingMiddleware:
+    """Замеряет SQL, представление и рендеринг каждого запроса.
+
+    Время представления — от process_view до process_template_response
+    (или до возврата ответа без отложенного рендеринга), время
+    рендеринга — до post-render callback ответа DRF. Потоковый ответ
+    попадает в метрики при закрытии, вместе с запросами его тела.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = request._timing = RequestTiming()
+        response = get_response_with_wrapper(
+            timing.queries,
+            self.get_response,
+            request,
+            partial(self.finish, request, timing),
+        )
+        if response.streaming:
+            # Заголовки уходят раньше тела: в них время до начала
+            # отправки, метрики учитывают и запросы тела.
+            response['Server-Timing'] = self.format_header(
+                self.get_values(timing, time.perf_counter()), timing
+            )
+        return response
+
+    def finish(self, request, timing, response):
+        values = self.get_values(timing, time.perf_counter())
+        response['Server-Timing'] = self.format_header(values, timing)
+        match = request.resolver_match
+        metrics.observe(
+            match.view_name if match else 'unmatched',
+            request.method,
+            response.status_code,
+            values,
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing.view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        if response.is_rendered:
+            # Отрендерен render_response() в потоке представления.
+            return response
+        timing = request._timing
+        timing.view_end = time.perf_counter()
+
+        def render_finished(response):
+            timing.render_end = time.perf_counter()
+
+        response.add_post_render_callback(render_finished)
+        return response
+
+    @staticmethod
+    def get_values(timing, end):
+        view_start = timing.view_start or timing.start
+        view_end = timing.view_end or end
+        render = 0.0
+        if timing.view_end and timing.render_end:
+            render = timing.render_end - timing.view_end
+        return {
+            'request_seconds': end - timing.start,
+            'view_seconds': view_end - view_start,
+            'render_seconds': render,
+            'sql_seconds': timing.queries.duration,
+            'sql_queries': timing.queries.count,
+        }
+
+    @staticmethod
+    def format_header(values, timing):
+        return ', '.join((
+            f'sql;dur={values["sql_seconds"] * 1000:.2f};'
+            f'desc="{timing.queries.count} queries"',
+            f'view;dur={values["view_seconds"] * 1000:.2f}',
+            f'render;dur={values["render_seconds"] * 1000:.2f}',
+            f'total;dur={values["request_seconds"] * 1000:.2f}',
+        ))
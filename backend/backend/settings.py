@@ -34,6 +34,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.instrumentation.ServerTimingMiddleware',
+    'api.slow_queries.SlowQueryMiddleware',
+    'backend.db_router.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,7 +46,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'backend.urls'
+ROOT_URLCONF = os.getenv('ROOT_URLCONF', default='backend.urls')
 
 TEMPLATES = [
     {
@@ -62,6 +65,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
 
 
 DATABASES = {
@@ -75,6 +79,58 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: хосты PostgreSQL или файлы SQLite через запятую.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), start=1
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        (
+            'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3')
+            else 'HOST'
+        ): replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+# Сколько секунд после записи чтения клиента идут в основную базу.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', default=10))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+DATA_VERSION_CACHE_TIMEOUT = int(
+    os.getenv('DATA_VERSION_CACHE_TIMEOUT', default=60)
+)
+REFERENCE_CACHE_TIMEOUT = int(
+    os.getenv('REFERENCE_CACHE_TIMEOUT', default=24 * 60 * 60)
+)
+AUTH_TOKEN_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=5 * 60)
+)
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', default='russian')
+
+# Размер ленты подписок и порог подписчиков, выше которого рецепты
+# автора не раскладываются по лентам, а читаются при запросе.
+FEED_MAX_ENTRIES = int(os.getenv('FEED_MAX_ENTRIES', default=500))
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=1000)
+)
+
+# Наибольшее число id в пакетных запросах избранного, корзины и подписок.
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', default=100))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -109,17 +165,81 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
     ],
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.LimitPageNumberPagination',
     'PAGE_SIZE': 6,
 }
 
 
+INGREDIENT_PREFIX_INDEX = (
+    os.getenv('INGREDIENT_PREFIX_INDEX', default='False') == 'True'
+)
+
+COMPILED_READ = os.getenv('COMPILED_READ', default='False') == 'True'
+
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', default=16))
+
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', default='False') == 'True'
+
+SLOW_QUERY_THRESHOLD_MS = float(
+    os.getenv('SLOW_QUERY_THRESHOLD_MS', default=0)
+)
+SLOW_QUERY_EXPLAIN_RATE = float(
+    os.getenv('SLOW_QUERY_EXPLAIN_RATE', default=0.1)
+)
+SLOW_QUERY_EXPLAIN_ANALYZE = (
+    os.getenv('SLOW_QUERY_EXPLAIN_ANALYZE', default='False') == 'True'
+)
+SLOW_QUERY_LOG_FILE = os.getenv(
+    'SLOW_QUERY_LOG_FILE', default=os.path.join(BASE_DIR, 'slow_queries.log')
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'foodgram.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+INGREDIENT_SEARCH_LIMIT = int(
+    os.getenv('INGREDIENT_SEARCH_LIMIT', default=20)
+)
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SEND_ACTIVATION_EMAIL': False,
@@ -142,3 +262,31 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Максимальное число SQL-запросов на эндпоинт для benchmark_api.
+API_QUERY_BUDGETS = {
+    'tags-list': 1,
+    'tags-detail': 1,
+    'ingredients-list': 1,
+    'ingredients-prefix': 1,
+    'ingredients-search': 1,
+    'ingredients-detail': 1,
+    'recipes-list': 4,
+    'recipes-list-keyset': 3,
+    'recipes-list-sparse': 3,
+    'recipes-filter': 5,
+    'recipes-search': 4,
+    'recipes-detail': 5,
+    'recipes-feed': 3,
+    'recipes-download-shopping-cart': 2,
+    'recipes-favorite:post': 4,
+    'recipes-favorite:delete': 4,
+    'recipes-shopping-cart:post': 5,
+    'recipes-shopping-cart:delete': 6,
+    'users-list': 2,
+    'users-me': 1,
+    'users-detail': 1,
+    'users-subscriptions': 3,
+    'users-subscribe:post': 7,
+    'users-subscribe:delete': 6,
+}
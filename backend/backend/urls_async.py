@@ -0,0 +1,7 @@
+"""URL-схема ASGI-режима: маршруты чтения api выполняются асинхронно."""
+
+from api.async_views import make_async
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = make_async(sync_urlpatterns)
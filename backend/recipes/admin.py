@@ -1,13 +1,18 @@
 from django.contrib import admin
+from django.db.models import Q
 
 from .models import (
     Favorite,
+    FeedEntry,
     Ingredient,
     NumberOfIngredients,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
     Tag
 )
+from .counters import RecountOnDeleteMixin
+from .search import refresh_documents
 
 
 EMPTY_VALUE = '-пусто-'
@@ -26,24 +31,35 @@ class RecipeAdmin(admin.ModelAdmin):
         'text',
         'cooking_time',
         'pub_date',
-        'get_favorite_count'
-    )
-    search_fields = (
-        'name',
-        'cooking_time',
-        'author__username',
-        'ingredients__name'
+        'favorites_count',
+        'in_carts_count',
     )
+    search_fields = ('cooking_time', 'author__username')
     list_filter = ('pub_date', 'tags',)
     empty_value_display = EMPTY_VALUE
 
-    @admin.display(description='В избранном')
-    def get_favorite_count(self, obj):
-        return obj.favorite.count()
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по search_fields и полнотекстовый поиск по документу."""
+
+        if not search_term:
+            return queryset, False
+        found, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        return queryset.filter(
+            Q(pk__in=found.values('pk'))
+            | Q(pk__in=queryset.search(search_term).values('pk'))
+        ), may_have_duplicates
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        refresh_documents(Recipe.objects.filter(pk=form.instance.pk))
+        if not change:
+            FeedEntry.objects.fan_out(form.instance)
 
 
 @admin.register(Favorite)
-class FavoritesAdmin(admin.ModelAdmin):
+class FavoritesAdmin(RecountOnDeleteMixin, admin.ModelAdmin):
     list_display = ('id', 'user',)
     empty_value_display = EMPTY_VALUE
 
@@ -72,6 +88,20 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(RecountOnDeleteMixin, admin.ModelAdmin):
     list_display = ('id', 'user')
     empty_value_display = EMPTY_VALUE
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount')
+    list_select_related = ('user', 'ingredient')
+    empty_value_display = EMPTY_VALUE
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'recipe', 'pub_date')
+    list_select_related = ('user', 'recipe')
+    empty_value_display = EMPTY_VALUE
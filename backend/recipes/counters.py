@@ -0,0 +1,121 @@
+"""Пересчёт денормализованных счётчиков рецептов и пользователей.
+
+Эндпоинты API меняют счётчики сами. Удаления в обход API (админка,
+каскадное удаление пользователя) пересчитывают счётчики объектов, на
+которые ссылались удалённые связи; расхождения находит и исправляет
+команда repair_counters.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Follow
+
+from .models import Favorite, Recipe, ShoppingCart
+
+
+def count_by(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешний объект."""
+
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+RECIPE_COUNTERS = {
+    'favorites_count': (Favorite, 'recipe'),
+    'in_carts_count': (ShoppingCart, 'recipe'),
+}
+USER_COUNTERS = {
+    'recipes_count': (Recipe, 'author'),
+    'followers_count': (Follow, 'author'),
+}
+# Связи пользователя и поле со ссылкой на объект, чей счётчик они задают.
+LINK_TARGETS = {
+    Favorite: 'recipe',
+    ShoppingCart: 'recipe',
+    Follow: 'author',
+}
+
+
+def get_counters(model):
+    return RECIPE_COUNTERS if model is Recipe else USER_COUNTERS
+
+
+def recount(queryset):
+    """Пересчитывает счётчики объектов queryset одним UPDATE."""
+
+    return queryset.update(**{
+        counter: count_by(*source)
+        for counter, source in get_counters(queryset.model).items()
+    })
+
+
+def find_drift(queryset):
+    """Объекты queryset, у которых хотя бы один счётчик не совпадает."""
+
+    counters = get_counters(queryset.model)
+    return queryset.annotate(**{
+        f'actual_{counter}': count_by(*source)
+        for counter, source in counters.items()
+    }).filter(reduce(or_, (
+        ~Q(**{counter: F(f'actual_{counter}')}) for counter in counters
+    )))
+
+
+def get_targets(queryset):
+    """id объектов со счётчиками, на которые ссылаются связи queryset."""
+
+    return set(queryset.values_list(
+        LINK_TARGETS[queryset.model], flat=True
+    ))
+
+
+def recount_targets(model, pks):
+    """Пересчитывает счётчики объектов, на которые ссылались связи model."""
+
+    target = model._meta.get_field(LINK_TARGETS[model]).related_model
+    return recount(target.objects.filter(pk__in=pks))
+
+
+def recount_user_links(user):
+    """Пересчёт счётчиков после каскадного удаления связей user.
+
+    id объектов собираются до удаления, пересчёт выполняется после
+    фиксации транзакции, когда связей уже нет.
+    """
+
+    targets = {
+        model: get_targets(model.objects.filter(user=user))
+        for model in LINK_TARGETS
+    }
+
+    def apply():
+        for model, pks in targets.items():
+            if pks:
+                recount_targets(model, pks)
+
+    transaction.on_commit(apply)
+
+
+class RecountOnDeleteMixin:
+    """Админка связей: счётчики пересчитываются после удаления."""
+
+    def delete_model(self, request, obj):
+        field = obj._meta.get_field(LINK_TARGETS[type(obj)])
+        pks = [getattr(obj, field.attname)]
+        super().delete_model(request, obj)
+        recount_targets(type(obj), pks)
+
+    def delete_queryset(self, request, queryset):
+        pks = get_targets(queryset)
+        super().delete_queryset(request, queryset)
+        recount_targets(queryset.model, pks)
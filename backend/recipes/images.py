@@ -0,0 +1,79 @@
+"""Уменьшенные копии изображений рецептов."""
+
+import io
+import os
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+IMAGE_VARIANTS = {
+    'thumbnail': (320, 320),
+    'medium': (960, 960),
+}
+VARIANT_FORMAT = 'WEBP'
+VARIANT_EXTENSION = 'webp'
+VARIANT_QUALITY = 80
+
+
+def variant_fields(variant):
+    """Поля модели с файлом, шириной и высотой копии variant."""
+
+    return (
+        f'image_{variant}',
+        f'image_{variant}_width',
+        f'image_{variant}_height',
+    )
+
+
+# Поля всех уменьшенных копий в порядке IMAGE_VARIANTS.
+VARIANT_FIELDS = tuple(
+    field for variant in IMAGE_VARIANTS for field in variant_fields(variant)
+)
+
+
+def render_variant(image, size):
+    """Возвращает копию изображения, вписанную в size, в формате WebP."""
+
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    variant.save(
+        buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def build_variants(recipe):
+    """Создаёт все уменьшенные копии изображения рецепта.
+
+    Файлы сохраняются в хранилище, а поля модели и их размеры
+    заполняются без сохранения самого рецепта. Возвращает имена
+    изменённых полей.
+    """
+
+    recipe.image.open('rb')
+    try:
+        with Image.open(recipe.image) as source:
+            source = ImageOps.exif_transpose(source)
+            if source.mode not in ('RGB', 'RGBA'):
+                source = source.convert(
+                    'RGBA' if 'transparency' in source.info else 'RGB'
+                )
+            base_name = os.path.splitext(
+                os.path.basename(recipe.image.name)
+            )[0]
+            updated_fields = []
+            for variant, size in IMAGE_VARIANTS.items():
+                field = getattr(recipe, f'image_{variant}')
+                if field:
+                    field.delete(save=False)
+                field.save(
+                    f'{base_name}_{variant}.{VARIANT_EXTENSION}',
+                    render_variant(source, size),
+                    save=False,
+                )
+                updated_fields.extend(variant_fields(variant))
+    finally:
+        recipe.image.close()
+    return updated_fields
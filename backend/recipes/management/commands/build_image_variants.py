@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand
+
+from recipes.images import build_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Generates thumbnails and medium images for existing recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild variants that already exist',
+        )
+        parser.add_argument('--chunk-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_thumbnail='')
+        built = failed = 0
+        for recipe in recipes.iterator(chunk_size=options['chunk_size']):
+            try:
+                updated_fields = build_variants(recipe)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+                continue
+            recipe.save(update_fields=updated_fields)
+            built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Изображения обработаны: {built}, ошибок: {failed}'
+        ))
@@ -1,23 +1,8 @@
-import csv
-
-from django.conf import settings
-from django.core.management import BaseCommand
-
-from recipes.models import Ingredient
+from django.core.management import BaseCommand, call_command
 
 
 class Command(BaseCommand):
+    help = 'Loads data/ingredients.csv (alias of import_ingredients)'
 
     def handle(self, *args, **options):
-        with open(
-            f'{settings.BASE_DIR}/data/ingredients.csv',
-            'r',
-            encoding='utf-8',
-        ) as file:
-            file_reader = csv.reader(file)
-            for row in file_reader:
-                name, measurement_unit = row
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=measurement_unit)
-        self.stdout.write(self.style.SUCCESS('Ингридиенты загружены!'))
+        call_command('import_ingredients', stdout=self.stdout)
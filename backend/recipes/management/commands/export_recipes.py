@@ -0,0 +1,53 @@
+import sys
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from recipes.models import Recipe
+from recipes.transfer import export_lines
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Exports recipes with tags and ingredients as NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Output file, "-" for stdout',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--author', help='Export only recipes of the user with this email'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Recipe.objects.all()
+        if options['author']:
+            author = User.objects.filter(email=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    f'Пользователь {options["author"]} не найден'
+                )
+            queryset = queryset.filter(author=author)
+        started = time.monotonic()
+        lines = export_lines(queryset, options['chunk_size'])
+        if options['path'] == '-':
+            count = self.write(sys.stdout, lines)
+            report = self.stderr
+        else:
+            with open(options['path'], 'w', encoding='utf-8') as file:
+                count = self.write(file, lines)
+            report = self.stdout
+        report.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {count} '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
+
+    @staticmethod
+    def write(file, lines):
+        count = 0
+        for chunk in lines:
+            file.write(chunk)
+            count += chunk.count('\n')
+        return count
@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the subscription feeds from follows and recipes'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            FeedEntry.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты подписок пересобраны: '
+            f'{FeedEntry.objects.count()} записей'
+        ))
@@ -0,0 +1,203 @@
+import io
+import random
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image
+
+from recipes.counters import recount
+from recipes.images import VARIANT_FIELDS, build_variants
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    NumberOfIngredients,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.search import refresh_documents
+from users.models import Follow, User
+
+DATASET_PASSWORD = 'dataset-password'
+DATASET_IMAGE = 'dataset.png'
+
+
+def bulk_insert(model, objects, batch_size, ignore_conflicts=False):
+    """Вставляет объекты пачками, не собирая их все в память."""
+
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        model.objects.bulk_create(
+            batch, batch_size=batch_size, ignore_conflicts=ignore_conflicts
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates synthetic users, recipes, favorites, carts and follows '
+        'on top of the existing ingredient and tag catalog'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Favorites per generated user',
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Shopping cart recipes per generated user',
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Subscriptions per generated user',
+        )
+        parser.add_argument(
+            '--max-ingredients', type=int, default=10,
+            help='Upper bound of ingredients per recipe',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        if not ingredient_ids or not tag_ids:
+            raise CommandError(
+                'Справочники пусты: сначала выполните import_ingredients '
+                'и tags_manager'
+            )
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                options['recipes'], user_ids, ingredient_ids, tag_ids,
+                options['max_ingredients'],
+            )
+            self.create_relations(
+                Favorite, 'recipe', user_ids, recipe_ids,
+                options['favorites'],
+            )
+            self.create_relations(
+                ShoppingCart, 'recipe', user_ids, recipe_ids,
+                options['carts'],
+            )
+            self.create_relations(
+                Follow, 'author', user_ids, user_ids, options['follows'],
+            )
+            recount(Recipe.objects.all())
+            recount(User.objects.all())
+            if recipe_ids:
+                refresh_documents(
+                    Recipe.objects.filter(pk__gte=min(recipe_ids))
+                )
+        call_command('shopping_lists', stdout=self.stdout)
+        call_command('feeds', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}. Пароль: {DATASET_PASSWORD}'
+        ))
+
+    @staticmethod
+    def next_pk(model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def create_users(self, count):
+        start = self.next_pk(User)
+        password = make_password(DATASET_PASSWORD)
+        bulk_insert(User, (
+            User(
+                username=f'dataset{number}',
+                email=f'dataset{number}@example.com',
+                first_name='Пользователь',
+                last_name=str(number),
+                password=password,
+            )
+            for number in range(start, start + count)
+        ), self.batch_size)
+        return list(
+            User.objects.filter(pk__gte=start).order_by('pk').values_list(
+                'pk', flat=True
+            )
+        )
+
+    def create_template(self):
+        """Общая картинка рецептов вместе с уменьшенными копиями."""
+
+        buffer = io.BytesIO()
+        Image.linear_gradient('L').convert('RGB').resize(
+            (1280, 960)
+        ).save(buffer, 'PNG')
+        template = Recipe()
+        template.image.save(
+            DATASET_IMAGE, ContentFile(buffer.getvalue()), save=False
+        )
+        build_variants(template)
+        fields = {'image': template.image.name}
+        for name in VARIANT_FIELDS:
+            value = getattr(template, name)
+            fields[name] = getattr(value, 'name', value)
+        return fields
+
+    def create_recipes(self, count, author_ids, ingredient_ids, tag_ids,
+                       max_ingredients):
+        if not author_ids:
+            author_ids = list(User.objects.values_list('pk', flat=True))
+        start = self.next_pk(Recipe)
+        image_fields = self.create_template()
+        bulk_insert(Recipe, (
+            Recipe(
+                author_id=self.random.choice(author_ids),
+                name=f'Рецепт {number}',
+                text=f'Синтетический рецепт номер {number}.',
+                cooking_time=self.random.randint(1, 180),
+                **image_fields,
+            )
+            for number in range(start, start + count)
+        ), self.batch_size)
+        recipe_ids = list(
+            Recipe.objects.filter(pk__gte=start).order_by('pk').values_list(
+                'pk', flat=True
+            )
+        )
+        bulk_insert(NumberOfIngredients, (
+            NumberOfIngredients(
+                recipe_id=recipe_id,
+                ingredients_id=ingredient_id,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.random.sample(
+                ingredient_ids,
+                self.random.randint(
+                    1, min(max_ingredients, len(ingredient_ids))
+                ),
+            )
+        ), self.batch_size)
+        bulk_insert(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.random.sample(
+                tag_ids, self.random.randint(1, len(tag_ids))
+            )
+        ), self.batch_size)
+        return recipe_ids
+
+    def create_relations(self, model, field, user_ids, target_ids, per_user):
+        bulk_insert(model, (
+            model(**{'user_id': user_id, f'{field}_id': target_id})
+            for user_id in user_ids
+            for target_id in self.random.sample(
+                target_ids, min(per_user, len(target_ids))
+            )
+            if target_id != user_id or model is not Follow
+        ), self.batch_size, ignore_conflicts=True)
@@ -0,0 +1,116 @@
+import csv
+import json
+import os
+import re
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from recipes.models import Ingredient
+from recipes.versions import bump_version
+
+
+DEFAULT_PATH = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+READ_CHUNK_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s\[,]*')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) != 2:
+            yield None
+            continue
+        yield row
+
+
+def read_json(file):
+    """Потоково читает JSON-массив объектов или NDJSON."""
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                if position < len(buffer):
+                    raise CommandError('Некорректный JSON в конце файла')
+                return
+            chunk = file.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if not isinstance(item, dict):
+            yield None
+            continue
+        yield item.get('name'), item.get('measurement_unit')
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = 'Imports ingredients from CSV or JSON in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument('--format', choices=READERS, default=None)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (
+            options['format']
+            or os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        started = time.monotonic()
+        before = Ingredient.objects.count()
+        stats = {'read': 0, 'invalid': 0, 'duplicates': 0}
+        with open(path, 'r', encoding='utf-8') as file:
+            rows = self.unique_rows(READERS[file_format](file), stats)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(
+                    batch, ignore_conflicts=True
+                )
+        inserted = Ingredient.objects.count() - before
+        if inserted:
+            bump_version(Ingredient)
+        unique = stats['read'] - stats['invalid'] - stats['duplicates']
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингридиенты загружены за {time.monotonic() - started:.2f} с: '
+            f'прочитано {stats["read"]}, добавлено {inserted}, '
+            f'пропущено существующих {unique - inserted}, '
+            f'дубликатов в файле {stats["duplicates"]}, '
+            f'некорректных строк {stats["invalid"]}'
+        ))
+
+    @staticmethod
+    def unique_rows(rows, stats):
+        seen = set()
+        for row in rows:
+            stats['read'] += 1
+            if row is None or not all(row):
+                stats['invalid'] += 1
+                continue
+            key = tuple(str(value).strip() for value in row)
+            if key in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(key)
+            yield Ingredient(name=key[0], measurement_unit=key[1])
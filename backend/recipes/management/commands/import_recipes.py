@@ -0,0 +1,282 @@
+import json
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipes.counters import recount
+from recipes.models import (
+    FeedEntry,
+    Ingredient,
+    NumberOfIngredients,
+    Recipe,
+    Tag,
+)
+from recipes.search import compose_document, sync_fts
+from recipes.transfer import IMAGE_FIELDS
+from recipes.versions import bump_version
+from users.models import User
+
+
+def read_records(file, stats):
+    for line in file:
+        if not line.strip():
+            continue
+        stats['read'] += 1
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = None
+        if not isinstance(record, dict):
+            stats['invalid'] += 1
+            continue
+        yield record
+
+
+def parse_record(record):
+    """Проверенные поля рецепта или None для некорректной записи."""
+
+    try:
+        name = str(record['name']).strip()
+        text = str(record['text'])
+        cooking_time = int(record['cooking_time'])
+        image = str(record['image'])
+        amounts = {}
+        for item in record['ingredients']:
+            key = (
+                str(item['name']).strip(),
+                str(item['measurement_unit']).strip(),
+            )
+            amounts[key] = amounts.get(key, 0) + int(item['amount'])
+        tags = [str(slug) for slug in record.get('tags') or ()]
+    except (KeyError, TypeError, ValueError):
+        return None
+    pub_date = parse_datetime(str(record.get('pub_date') or ''))
+    if (
+        not name or not image or cooking_time < 1 or not amounts
+        or min(amounts.values()) < 1
+    ):
+        return None
+    if pub_date is not None and timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date)
+    images = {}
+    for field in IMAGE_FIELDS[1:]:
+        value = record.get(field)
+        if field.endswith(('_width', '_height')):
+            images[field] = value if isinstance(value, int) else None
+        else:
+            images[field] = value or ''
+    return {
+        'author': record.get('author'),
+        'name': name,
+        'text': text,
+        'cooking_time': cooking_time,
+        'image': image,
+        'images': images,
+        'pub_date': pub_date,
+        'tags': tags,
+        'amounts': amounts,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports recipes from NDJSON produced by export_recipes, '
+        'in batches with one transaction per batch'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--default-author',
+            help='Email of the author for records whose author is unknown',
+        )
+
+    def handle(self, *args, **options):
+        self.default_author = None
+        if options['default_author']:
+            self.default_author = User.objects.filter(
+                email=options['default_author']
+            ).values_list('pk', flat=True).first()
+            if self.default_author is None:
+                raise CommandError(
+                    f'Пользователь {options["default_author"]} не найден'
+                )
+        self.tags = {
+            slug: (pk, name) for pk, slug, name in
+            Tag.objects.values_list('pk', 'slug', 'name')
+        }
+        self.author_ids = set()
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('pk', 'name', 'measurement_unit')
+        }
+        started = time.monotonic()
+        stats = dict.fromkeys((
+            'read', 'invalid', 'no_author', 'existing', 'imported',
+            'unknown_tags', 'new_ingredients',
+        ), 0)
+        with open(options['path'], 'r', encoding='utf-8') as file:
+            records = read_records(file, stats)
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                self.import_batch(batch, stats)
+        authors = sorted(self.author_ids)
+        for start in range(0, len(authors), options['batch_size']):
+            FeedEntry.objects.backfill(
+                authors[start:start + options['batch_size']]
+            )
+        if stats['new_ingredients']:
+            bump_version(Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецепты загружены за {time.monotonic() - started:.2f} с: '
+            f'прочитано {stats["read"]}, добавлено {stats["imported"]}, '
+            f'пропущено существующих {stats["existing"]}, '
+            f'без автора {stats["no_author"]}, '
+            f'некорректных строк {stats["invalid"]}, '
+            f'новых ингредиентов {stats["new_ingredients"]}, '
+            f'неизвестных тэгов {stats["unknown_tags"]}'
+        ))
+
+    def prepare(self, batch, stats):
+        """Разбирает записи пачки и отбрасывает уже загруженные.
+
+        Загруженной считается запись с тем же автором, названием и датой
+        публикации, а запись без даты — с тем же автором и названием.
+        """
+
+        parsed = []
+        for record in batch:
+            item = parse_record(record)
+            if item is None:
+                stats['invalid'] += 1
+            else:
+                parsed.append(item)
+        authors = dict(User.objects.filter(
+            email__in={item['author'] for item in parsed if item['author']}
+        ).values_list('email', 'pk'))
+        items = []
+        for item in parsed:
+            item['author_id'] = authors.get(
+                item['author'], self.default_author
+            )
+            if item['author_id'] is None:
+                stats['no_author'] += 1
+            else:
+                items.append(item)
+        existing = set(Recipe.objects.filter(
+            author_id__in={item['author_id'] for item in items},
+            name__in={item['name'] for item in items},
+        ).values_list('author_id', 'name', 'pub_date'))
+        existing |= {(author, name, None) for author, name, _ in existing}
+        fresh = []
+        for item in items:
+            key = (item['author_id'], item['name'], item['pub_date'])
+            if key not in existing:
+                existing.add(key)
+                existing.add(key[:2] + (None,))
+                fresh.append(item)
+        stats['existing'] += len(items) - len(fresh)
+        return fresh
+
+    def add_ingredients(self, items, stats):
+        missing = {
+            key for item in items for key in item['amounts']
+            if key not in self.ingredients
+        }
+        if not missing:
+            return
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in missing],
+            ignore_conflicts=True,
+        )
+        names = {name for name, _ in missing}
+        for pk, name, unit in Ingredient.objects.filter(
+            name__in=names
+        ).values_list('pk', 'name', 'measurement_unit'):
+            self.ingredients[(name, unit)] = pk
+        stats['new_ingredients'] += len(missing)
+
+    def build_recipe(self, item, stats):
+        """Рецепт с готовым поисковым документом и id его тэгов."""
+
+        tags = []
+        for slug in dict.fromkeys(item['tags']):
+            if slug in self.tags:
+                tags.append(self.tags[slug])
+            else:
+                stats['unknown_tags'] += 1
+        tags.sort()
+        ingredients = sorted(item['amounts'], key=self.ingredients.get)
+        recipe = Recipe(
+            author_id=item['author_id'],
+            name=item['name'],
+            text=item['text'],
+            cooking_time=item['cooking_time'],
+            image=item['image'],
+            search_document=compose_document(
+                item['name'],
+                item['text'],
+                (name for _, name in tags),
+                (name for name, _ in ingredients),
+            ),
+            **item['images'],
+        )
+        return recipe, [pk for pk, _ in tags]
+
+    @transaction.atomic
+    def import_batch(self, batch, stats):
+        items = self.prepare(batch, stats)
+        if not items:
+            return
+        self.add_ingredients(items, stats)
+        recipes, tags = zip(*(
+            self.build_recipe(item, stats) for item in items
+        ))
+        last_pk = Recipe.objects.aggregate(last=Max('pk'))['last'] or 0
+        Recipe.objects.bulk_create(recipes)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # SQLite в Django 3.2 не возвращает ключи: записи пачки идут
+            # подряд после last_pk, пока транзакция держит блокировку.
+            pks = Recipe.objects.filter(pk__gt=last_pk).order_by(
+                'pk'
+            ).values_list('pk', flat=True)
+            for recipe, pk in zip(recipes, pks):
+                recipe.pk = pk
+        # bulk_create ставит pub_date по auto_now_add, дата из файла
+        # записывается следом обновлением.
+        dated = []
+        for recipe, item in zip(recipes, items):
+            if item['pub_date'] is not None:
+                recipe.pub_date = item['pub_date']
+                dated.append(recipe)
+        Recipe.objects.bulk_update(dated, ['pub_date'])
+        NumberOfIngredients.objects.bulk_create([
+            NumberOfIngredients(
+                recipe_id=recipe.pk,
+                ingredients_id=self.ingredients[key],
+                amount=amount,
+            )
+            for recipe, item in zip(recipes, items)
+            for key, amount in item['amounts'].items()
+        ])
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe, tag_ids in zip(recipes, tags)
+            for tag_id in tag_ids
+        ])
+        sync_fts(Recipe, {
+            recipe.pk: recipe.search_document for recipe in recipes
+        })
+        author_ids = {recipe.author_id for recipe in recipes}
+        recount(User.objects.filter(pk__in=author_ids))
+        self.author_ids |= author_ids
+        stats['imported'] += len(recipes)
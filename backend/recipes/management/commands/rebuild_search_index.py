@@ -0,0 +1,42 @@
+from django.core.management import BaseCommand
+from django.db import connections, router, transaction
+
+from recipes.models import Recipe
+from recipes.search import (
+    install_search_index,
+    refresh_documents,
+    uninstall_search_index,
+)
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds recipe search documents and the full-text index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reindex',
+            action='store_true',
+            help='Drop and recreate the full-text index before filling it',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of recipes processed per query',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[router.db_for_write(Recipe)]
+        if options['reindex']:
+            with connection.schema_editor() as editor:
+                uninstall_search_index(editor, Recipe)
+                install_search_index(editor, Recipe)
+        with transaction.atomic(using=connection.alias):
+            written = refresh_documents(
+                Recipe.objects.using(connection.alias),
+                force=True,
+                batch_size=options['batch_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковых документов перестроено: {written}'
+        ))
@@ -0,0 +1,39 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import find_drift, recount
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recomputes denormalized recipe and user counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report objects whose counters drifted',
+        )
+
+    def handle(self, *args, **options):
+        querysets = (Recipe.objects.all(), User.objects.all())
+        drifted = {
+            queryset.model._meta.verbose_name_plural:
+                list(find_drift(queryset).values_list('pk', flat=True))
+            for queryset in querysets
+        }
+        report = '; '.join(
+            f'{name}: {len(pks)}' for name, pks in drifted.items()
+        )
+        if options['check']:
+            if any(drifted.values()):
+                raise CommandError(f'Счётчики расходятся — {report}')
+            self.stdout.write(self.style.SUCCESS('Счётчики согласованы'))
+            return
+        with transaction.atomic():
+            for queryset in querysets:
+                recount(queryset)
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны, исправлено — {report}'
+        ))
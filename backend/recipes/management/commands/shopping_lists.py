@@ -0,0 +1,59 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds or verifies the aggregated shopping lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare stored lists with the carts',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+        else:
+            self.rebuild(options['batch_size'])
+
+    def rebuild(self, batch_size):
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                (
+                    ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=total,
+                    )
+                    for user_id, ingredient_id, total
+                    in ShoppingListItem.objects.expected().iterator()
+                ),
+                batch_size=batch_size,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны: '
+            f'{ShoppingListItem.objects.count()} позиций'
+        ))
+
+    def verify(self):
+        expected = set(ShoppingListItem.objects.expected().iterator())
+        stored = set(ShoppingListItem.objects.values_list(
+            'user', 'ingredient', 'amount'
+        ).iterator())
+        mismatched_users = {
+            user_id for user_id, _, _ in expected ^ stored
+        }
+        if mismatched_users:
+            raise CommandError(
+                f'Расхождения в списках покупок пользователей: '
+                f'{", ".join(map(str, sorted(mismatched_users)))}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок согласованы: {len(stored)} позиций'
+        ))
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:09
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    NumberOfIngredients = apps.get_model('recipes', 'NumberOfIngredients')
+    # order_by() сбрасывает Meta.ordering: иначе id попадает в GROUP BY
+    # и группы дубликатов не находятся.
+    duplicates = Ingredient.objects.order_by().values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        ids = Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).values_list('id', flat=True)
+        rows = {}
+        for row in NumberOfIngredients.objects.filter(
+            ingredients_id__in=ids
+        ).order_by('recipe_id', 'id'):
+            rows.setdefault(row.recipe_id, []).append(row)
+        for recipe_rows in rows.values():
+            # Строки рецепта с дубликатами сливаются в одну с суммой
+            # количеств; лишние удаляются до перепривязки, иначе
+            # перепривязка нарушила бы recipe_ingredient_constraint.
+            keep = next(
+                (
+                    row for row in recipe_rows
+                    if row.ingredients_id == group['keep_id']
+                ),
+                recipe_rows[0],
+            )
+            NumberOfIngredients.objects.filter(
+                id__in=[row.id for row in recipe_rows if row is not keep]
+            ).delete()
+            keep.amount = sum(row.amount for row in recipe_rows)
+            keep.ingredients_id = group['keep_id']
+            keep.save(update_fields=['ingredients', 'amount'])
+        Ingredient.objects.filter(id__in=ids).exclude(
+            id=group['keep_id']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_measurement_unit'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_medium',
+            field=models.ImageField(blank=True, editable=False, height_field='image_medium_height', upload_to='recipe/medium/', verbose_name='Картинка среднего размера', width_field='image_medium_width'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_medium_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_medium_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, height_field='image_thumbnail_height', upload_to='recipe/thumbnail/', verbose_name='Миниатюра', width_field='image_thumbnail_width'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Копия SQL из recipes.search на момент миграции: дальнейшие изменения
+# модуля не должны менять уже применённую схему.
+SEARCH_INDEX_NAME = 'recipe_search_idx'
+FTS_TABLE = 'recipes_recipe_fts'
+BATCH_SIZE = 500
+
+
+def build_document(recipe):
+    return '\n'.join([
+        recipe.name,
+        recipe.text,
+        *(tag.name for tag in recipe.tags.all()),
+        *(ingredient.name for ingredient in recipe.ingredients.all()),
+    ])
+
+
+def fill_documents(Recipe, schema_editor):
+    """Записывает поисковые документы и, в SQLite, строки FTS5."""
+
+    queryset = Recipe.objects.only(
+        'id', 'name', 'text', 'search_document'
+    ).prefetch_related('tags', 'ingredients').order_by('pk')
+    sqlite = schema_editor.connection.vendor == 'sqlite'
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        for recipe in batch:
+            recipe.search_document = build_document(recipe)
+        Recipe.objects.bulk_update(batch, ['search_document'])
+        if sqlite:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, search_document) '
+                    'VALUES (%s, %s)',
+                    [
+                        (
+                            recipe.pk,
+                            recipe.search_document.lower().replace('ё', 'е'),
+                        )
+                        for recipe in batch
+                    ],
+                )
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_INDEX_NAME} ON recipes_recipe '
+            'USING gin (to_tsvector(%s::regconfig, '
+            "COALESCE(search_document, '')))",
+            [settings.RECIPE_SEARCH_CONFIG],
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            'USING fts5(search_document, '
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+    fill_documents(apps.get_model('recipes', 'Recipe'), schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX_NAME}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Поисковый документ'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:41
+
+from django.db import migrations
+
+# Копия SQL из recipes.search на момент миграции.
+TRIGRAM_INDEX_NAME = 'ingredient_name_trgm_idx'
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            f'CREATE INDEX {TRIGRAM_INDEX_NAME} ON recipes_ingredient '
+            'USING gin (name gin_trgm_ops)'
+        )
+
+
+def drop_trigram_index(apps, schema_editor):
+    """Удаляет индекс; расширение pg_trgm остаётся в базе."""
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_search_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -1,9 +1,24 @@
 """Создание моделей."""
 
+from django.conf import settings
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models import (
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Greatest
 
-from users.models import User
+from users.models import Follow, User
+
+from .images import VARIANT_FIELDS, build_variants
+from .search import FTS_TABLE, search_recipes
 
 
 INGREDIENT_NAME_LENGTH = 200
@@ -13,6 +28,24 @@ TAG_COLOR_LENGTH = 10
 TAG_SLUG_LENGTH = 50
 RECIPE_NAME_LENGTH = 200
 COCKING_TIME_MESSAGE = 'Время приготовления не может быть менее 1 минуты'
+RECIPE_USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+# Колонки рецепта для полей ответа API. Дата публикации загружается
+# всегда: по ней строятся сортировка и курсор постраничного вывода.
+RECIPE_READ_COLUMNS = {
+    'id': ('id',),
+    'author': (
+        'author',
+        'author__email',
+        'author__username',
+        'author__first_name',
+        'author__last_name',
+    ),
+    'name': ('name',),
+    'image': ('image',),
+    'image_variants': VARIANT_FIELDS,
+    'text': ('text',),
+    'cooking_time': ('cooking_time',),
+}
 
 
 class Ingredient(models.Model):
@@ -35,6 +68,12 @@ class Ingredient(models.Model):
         ordering = ['id', ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_name_measurement_unit',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -70,6 +109,131 @@ class Tag(models.Model):
         return self.name[:20]
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов для чтения через API."""
+
+    def with_user_flags(
+        self, user, flags=RECIPE_USER_FLAGS + ('author_is_subscribed',)
+    ):
+        """Аннотирует флаги избранного, корзины и подписки на автора.
+
+        flags ограничивает набор аннотаций.
+        """
+
+        if not user.is_authenticated:
+            return self.annotate(
+                **dict.fromkeys(flags, Value(False, models.BooleanField()))
+            )
+        conditions = {
+            'is_favorited': Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            'is_in_shopping_cart': Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            'author_is_subscribed': Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        }
+        return self.annotate(**{flag: conditions[flag] for flag in flags})
+
+    def with_related(self, fields=('author', 'tags', 'ingredients')):
+        """Подгружает автора, тэги и ингредиенты фиксированным числом
+        запросов; связи, которых нет в fields, не загружаются."""
+
+        queryset = self
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        lookups = []
+        if 'tags' in fields:
+            lookups.append('tags')
+        if 'ingredients' in fields:
+            lookups.append(Prefetch(
+                'amount_ingredients',
+                queryset=NumberOfIngredients.objects.select_related(
+                    'ingredients'
+                ).order_by('pk'),
+            ))
+        return queryset.prefetch_related(*lookups)
+
+    def for_read(self, user, fields=None):
+        """Рецепты для RecipeReadSerializer.
+
+        Если задан список полей ответа fields, флаги и связи остальных
+        полей не загружаются, а колонки ограничиваются only().
+        """
+
+        if fields is None:
+            return self.with_related().with_user_flags(user)
+        flags = [flag for flag in RECIPE_USER_FLAGS if flag in fields]
+        if 'author' in fields:
+            flags.append('author_is_subscribed')
+        columns = {'id', 'pub_date'}
+        for field in fields:
+            columns.update(RECIPE_READ_COLUMNS.get(field, ()))
+        return self.with_related(fields).with_user_flags(
+            user, flags
+        ).only(*columns)
+
+    def search(self, query):
+        """Полнотекстовый поиск с сортировкой по релевантности."""
+
+        return search_recipes(self, query)
+
+    def feed(self, user, position=None, limit=None):
+        """Рецепты авторов, на которых подписан user.
+
+        Рецепты авторов с числом подписчиков не больше
+        FEED_FANOUT_MAX_FOLLOWERS выбираются из ленты FeedEntry по
+        индексу feed_user_pub_date_idx, к ним добавляются рецепты
+        остальных авторов из таблицы рецептов. position — (pub_date, id)
+        последнего показанного рецепта; limit ограничивает выборку из
+        каждого источника, поэтому страница не читает ленты целиком.
+        """
+
+        fanned_out = Q(feed_entries__user=user)
+        pulled = self.filter(author__in=Follow.objects.filter(
+            user=user,
+            author__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+        ).values('author'))
+        if position is not None:
+            pub_date, pk = position
+            # Условие на запись ленты задаётся в том же filter(), что и
+            # пользователь, иначе Django присоединит ленту второй раз.
+            # Граница pub_date <= позволяет начать чтение индекса сразу
+            # с позиции курсора.
+            fanned_out &= Q(feed_entries__pub_date__lte=pub_date) & (
+                Q(feed_entries__pub_date__lt=pub_date)
+                | Q(feed_entries__pub_date=pub_date, pk__lt=pk)
+            )
+            pulled = pulled.filter(
+                Q(pub_date__lte=pub_date),
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk),
+            )
+        fanned_out = self.filter(fanned_out).order_by(
+            '-feed_entries__pub_date', '-pk'
+        ).values('pk')
+        pulled = pulled.order_by('-pub_date', '-pk').values('pk')
+        if limit is not None:
+            fanned_out, pulled = fanned_out[:limit], pulled[:limit]
+        return self.filter(Q(pk__in=fanned_out) | Q(pk__in=pulled))
+
+    def limited_per_author(self, limit):
+        """Оставляет не более limit последних рецептов каждого автора.
+
+        Предназначен для Prefetch по авторам: все авторы страницы
+        обрабатываются одним запросом с коррелированным подзапросом.
+        """
+
+        if limit is None:
+            return self
+        return self.filter(pk__in=Subquery(
+            Recipe.objects.filter(
+                author=OuterRef('author')
+            ).values('pk')[:limit]
+        ))
+
+
 class Recipe(models.Model):
     """Модель рецептов."""
 
@@ -99,6 +263,10 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
     cooking_time = models.PositiveIntegerField(
         verbose_name='Время приготовления (минуты)',
         validators=[
@@ -112,9 +280,55 @@ class Recipe(models.Model):
         verbose_name='Картинка',
         upload_to='recipe/',
     )
+    image_thumbnail = models.ImageField(
+        verbose_name='Миниатюра',
+        upload_to='recipe/thumbnail/',
+        blank=True,
+        editable=False,
+        width_field='image_thumbnail_width',
+        height_field='image_thumbnail_height',
+    )
+    image_thumbnail_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_thumbnail_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_medium = models.ImageField(
+        verbose_name='Картинка среднего размера',
+        upload_to='recipe/medium/',
+        blank=True,
+        editable=False,
+        width_field='image_medium_width',
+        height_field='image_medium_height',
+    )
+    image_medium_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_medium_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
     text = models.TextField(
         verbose_name='Описание',
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False,
+    )
+    search_document = models.TextField(
+        verbose_name='Поисковый документ',
+        blank=True,
+        default='',
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         """Дополнительные параметры модели."""
@@ -122,10 +336,47 @@ class Recipe(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name[:20]
 
+    def save(self, *args, **kwargs):
+        image_changed = self.image and not self.image._committed
+        super().save(*args, **kwargs)
+        if image_changed:
+            super().save(update_fields=build_variants(self))
+
+
+class RecipeSearchEntry(models.Model):
+    """Строка таблицы FTS5 с поисковым документом рецепта.
+
+    Таблица существует только в SQLite и заполняется recipes.search;
+    модель нужна, чтобы присоединять её к рецептам в запросах.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_entry',
+    )
+    search_document = models.TextField()
+    # Скрытый столбец FTS5 с именем таблицы: по нему MATCH ищет во всех
+    # столбцах, и он же — аргумент bm25().
+    fts = models.TextField(db_column=FTS_TABLE, editable=False)
+
+    class Meta:
+        """Дополнительные параметры модели."""
+
+        managed = False
+        db_table = FTS_TABLE
+
 
 class NumberOfIngredients(models.Model):
     """Модель числа ингредиентов."""
@@ -224,3 +475,332 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Список покупок {self.user}.'
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    """Поддержка сводного списка покупок в актуальном состоянии.
+
+    Методы add_recipe и remove_recipe пересчитывают суммы для всех
+    пользователей, у которых рецепт лежит в корзине, либо только для
+    user. Вызывать их нужно, пока строки корзины существуют: add_recipe
+    после добавления в корзину, remove_recipe до удаления из неё.
+    """
+
+    def add_recipe(self, recipe, user=None):
+        item_table = self.model._meta.db_table
+        user_filter, params = '', [recipe.pk]
+        if user is not None:
+            user_filter, params = ' AND cart.user_id = %s', params + [user.pk]
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {item_table} (user_id, ingredient_id, amount) '
+                f'SELECT cart.user_id, amount.ingredients_id, amount.amount '
+                f'FROM {ShoppingCart._meta.db_table} cart '
+                f'JOIN {NumberOfIngredients._meta.db_table} amount '
+                f'ON amount.recipe_id = cart.recipe_id '
+                f'WHERE cart.recipe_id = %s{user_filter} '
+                f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                f'SET amount = {item_table}.amount + excluded.amount',
+                params,
+            )
+
+    def remove_recipe(self, recipe, user=None):
+        carts = ShoppingCart.objects.filter(recipe=recipe)
+        if user is not None:
+            carts = carts.filter(user=user)
+        items = self.filter(
+            user__in=carts.values('user'),
+            ingredient__in=NumberOfIngredients.objects.filter(
+                recipe=recipe
+            ).values('ingredients'),
+        )
+        items.update(amount=Greatest(
+            F('amount') - Subquery(NumberOfIngredients.objects.filter(
+                recipe=recipe, ingredients=OuterRef('ingredient')
+            ).values('amount')),
+            0,
+        ))
+        self.filter(user__in=carts.values('user'), amount=0).delete()
+
+    def rebuild(self, user):
+        """Пересобирает список покупок user по его корзине."""
+
+        self.filter(user=user).delete()
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                f'(user_id, ingredient_id, amount) '
+                f'SELECT cart.user_id, amount.ingredients_id, '
+                f'SUM(amount.amount) '
+                f'FROM {ShoppingCart._meta.db_table} cart '
+                f'JOIN {NumberOfIngredients._meta.db_table} amount '
+                f'ON amount.recipe_id = cart.recipe_id '
+                f'WHERE cart.user_id = %s '
+                f'GROUP BY cart.user_id, amount.ingredients_id',
+                [user.pk],
+            )
+
+    def expected(self):
+        """Суммы, вычисленные заново по корзинам пользователей."""
+
+        return NumberOfIngredients.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values_list(
+            'recipe__shopping_cart__user', 'ingredients'
+        ).annotate(total=Sum('amount')).order_by()
+
+
+class ShoppingListItem(models.Model):
+    """Сводная позиция списка покупок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        """Дополнительные параметры модели."""
+
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient', ],
+                name='unique_shopping_list_item'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount} для {self.user}'
+
+
+def is_fanned_out(author):
+    """Рецепты автора раскладываются по лентам подписчиков при записи."""
+
+    return author.followers_count <= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    """Поддержка лент подписок, заполняемых при публикации рецепта.
+
+    В ленте каждого пользователя хранится не больше FEED_MAX_ENTRIES
+    последних записей. Авторы с большим числом подписчиков в ленты не
+    раскладываются, их рецепты читает RecipeQuerySet.feed.
+    """
+
+    def fan_out(self, recipe):
+        """Добавляет новый рецепт в ленты подписчиков автора.
+
+        Лента каждого подписчика вырастает не больше чем на запись,
+        поэтому удаляется только запись на позиции FEED_MAX_ENTRIES + 1,
+        найденная по индексу feed_user_pub_date_idx. Записи упорядочены
+        так же, как в trim() и в ленте.
+        """
+
+        if not is_fanned_out(recipe.author):
+            return
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(user_id, recipe_id, pub_date) '
+                f'SELECT follow.user_id, %s, %s '
+                f'FROM {Follow._meta.db_table} follow '
+                f'WHERE follow.author_id = %s '
+                f'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+                [recipe.pk, recipe.pub_date, recipe.author_id],
+            )
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ('
+                f'SELECT (SELECT entry.id FROM {table} entry '
+                f'WHERE entry.user_id = follow.user_id '
+                f'ORDER BY entry.pub_date DESC, entry.recipe_id DESC '
+                f'LIMIT 1 OFFSET %s) '
+                f'FROM {Follow._meta.db_table} follow '
+                f'WHERE follow.author_id = %s)',
+                [settings.FEED_MAX_ENTRIES, recipe.author_id],
+            )
+
+    def backfill(self, authors=None, user=None, returned=False):
+        """Добавляет последние рецепты authors (id, по умолчанию всех
+        авторов) в ленты их подписчиков или только в ленту user.
+
+        Авторы с числом подписчиков выше порога пропускаются, с returned
+        берутся только авторы ровно на пороге. Число подписчиков
+        читается в том же запросе, что и вставка.
+        """
+
+        if authors is not None:
+            authors = list(authors)
+            if not authors:
+                return
+        author_filter, params = '', []
+        if authors is not None:
+            author_filter = (
+                f'WHERE author_id IN ({", ".join(["%s"] * len(authors))}) '
+            )
+            params.extend(authors)
+        params += [
+            settings.FEED_MAX_ENTRIES, settings.FEED_FANOUT_MAX_FOLLOWERS
+        ]
+        user_filter = ''
+        if user is not None:
+            user_filter = ' AND follow.user_id = %s'
+            params.append(user.pk)
+        threshold = '=' if returned else '<='
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                f'(user_id, recipe_id, pub_date) '
+                f'SELECT follow.user_id, latest.id, latest.pub_date '
+                f'FROM {Follow._meta.db_table} follow '
+                f'JOIN {User._meta.db_table} author '
+                f'ON author.id = follow.author_id '
+                f'JOIN (SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+                f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+                f') AS position FROM {Recipe._meta.db_table} '
+                f'{author_filter}) latest '
+                f'ON latest.author_id = follow.author_id '
+                f'WHERE latest.position <= %s '
+                f'AND author.followers_count {threshold} %s{user_filter} '
+                f'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+                params,
+            )
+            inserted = cursor.rowcount
+        if not inserted:
+            return
+        if user is not None:
+            self.trim([user.pk])
+        elif authors is not None:
+            self.trim(Follow.objects.filter(
+                author__in=authors
+            ).values('user'))
+        else:
+            self.trim()
+
+    def backfill_returned(self, authors):
+        """Догружает ленты для authors (id), у которых после отписки
+        осталось ровно FEED_FANOUT_MAX_FOLLOWERS подписчиков.
+
+        Число подписчиков читается из базы после его обновления, поэтому
+        переход через порог не теряется при одновременных отписках.
+        """
+
+        self.backfill(authors, returned=True)
+
+    def prune(self, authors, user):
+        """Убирает рецепты authors из ленты user после отписки."""
+
+        self.filter(user=user, recipe__author__in=authors).delete()
+
+    def trim(self, users=None):
+        """Удаляет из лент users (id или запрос с ними, по умолчанию —
+        всех пользователей) записи сверх FEED_MAX_ENTRIES."""
+
+        user_filter, params = '', []
+        if isinstance(users, models.QuerySet):
+            sql, params = users.query.sql_with_params()
+            user_filter = f'WHERE user_id IN ({sql}) '
+        elif users is not None:
+            params = list(users)
+            if not params:
+                return
+            user_filter = (
+                f'WHERE user_id IN ({", ".join(["%s"] * len(params))}) '
+            )
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ('
+                f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+                f'PARTITION BY user_id ORDER BY pub_date DESC, recipe_id DESC'
+                f') AS position FROM {table} {user_filter}) ranked '
+                f'WHERE position > %s)',
+                [*params, settings.FEED_MAX_ENTRIES],
+            )
+
+    def rebuild(self):
+        """Заполняет все ленты заново по подпискам и рецептам."""
+
+        self.all().delete()
+        self.backfill()
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='feed',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        """Дополнительные параметры модели."""
+
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe', ],
+                name='unique_feed_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'], name='feed_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class DataVersion(models.Model):
+    """Счётчик изменений таблицы для условных запросов и кеша."""
+
+    name = models.CharField(
+        verbose_name='Таблица',
+        max_length=100,
+        unique=True,
+    )
+    version = models.PositiveBigIntegerField(
+        verbose_name='Версия',
+        default=0,
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+
+    class Meta:
+        """Дополнительные параметры модели."""
+
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
@@ -0,0 +1,227 @@
+"""Поиск по рецептам и ингредиентам.
+
+Поисковый документ рецепта (название, описание, теги и ингредиенты)
+хранится в поле Recipe.search_document. В PostgreSQL по нему строится
+функциональный GIN-индекс над to_tsvector, в SQLite — таблица FTS5,
+которая синхронизируется вместе с документом.
+
+Ингредиенты в PostgreSQL ищутся по триграммам pg_trgm с GIN-индексом
+по названию; для остальных СУБД есть индекс в памяти процесса
+(api.ingredient_index) с теми же порогами.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import BooleanField, F, FloatField, Func, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest, Length
+
+SEARCH_INDEX_NAME = 'recipe_search_idx'
+FTS_TABLE = 'recipes_recipe_fts'
+WORD_RE = re.compile(r'\w+')
+# Значения по умолчанию pg_trgm.similarity_threshold
+# и pg_trgm.word_similarity_threshold.
+SIMILARITY_THRESHOLD = 0.3
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+
+def get_search_vector():
+    # django.contrib.postgres.search требует psycopg2 при импорте.
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector(
+        'search_document', config=settings.RECIPE_SEARCH_CONFIG
+    )
+
+
+def get_search_index():
+    from django.contrib.postgres.indexes import GinIndex
+
+    return GinIndex(get_search_vector(), name=SEARCH_INDEX_NAME)
+
+
+def install_search_index(schema_editor, model):
+    """Создаёт поисковый индекс под используемую СУБД."""
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.add_index(model, get_search_index())
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            'USING fts5(search_document, '
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def uninstall_search_index(schema_editor, model):
+    """Удаляет поисковый индекс."""
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.remove_index(model, get_search_index())
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def compose_document(name, text, tag_names, ingredient_names):
+    return '\n'.join([name, text, *tag_names, *ingredient_names])
+
+
+def build_document(recipe):
+    """Собирает текст поискового документа рецепта."""
+
+    return compose_document(
+        recipe.name,
+        recipe.text,
+        (tag.name for tag in recipe.tags.all()),
+        (ingredient.name for ingredient in recipe.ingredients.all()),
+    )
+
+
+def normalize(text):
+    """Приводит текст к виду, в котором он хранится в FTS5.
+
+    Токенизатор unicode61 не считает «ё» вариантом «е».
+    """
+
+    return text.lower().replace('ё', 'е')
+
+
+def sync_fts(model, documents):
+    """Переносит документы {pk: текст} в таблицу FTS5 (только SQLite)."""
+
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != 'sqlite' or not documents:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(pk,) for pk in documents],
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, search_document) '
+            'VALUES (%s, %s)',
+            [(pk, normalize(text)) for pk, text in documents.items()],
+        )
+
+
+def delete_documents(model, pks):
+    """Удаляет документы удалённых рецептов из FTS5 (только SQLite)."""
+
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(pk,) for pk in pks],
+        )
+
+
+def refresh_documents(queryset, force=False, batch_size=500):
+    """Пересчитывает поисковые документы рецептов из queryset.
+
+    Записываются только изменившиеся документы, с force=True — все.
+    Возвращает количество записанных документов.
+    """
+
+    queryset = queryset.only(
+        'id', 'name', 'text', 'search_document'
+    ).prefetch_related('tags', 'ingredients').order_by('pk')
+    written = 0
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return written
+        last_pk = batch[-1].pk
+        changed = []
+        for recipe in batch:
+            document = build_document(recipe)
+            if force or document != recipe.search_document:
+                recipe.search_document = document
+                changed.append(recipe)
+        if changed:
+            queryset.model.objects.bulk_update(changed, ['search_document'])
+            sync_fts(queryset.model, {
+                recipe.pk: recipe.search_document for recipe in changed
+            })
+            written += len(changed)
+
+
+def search_recipes(queryset, query):
+    """Фильтрует рецепты по запросу и аннотирует релевантность.
+
+    Результат упорядочен по search_rank, затем по дате публикации.
+    """
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        vector = get_search_vector()
+        search_query = SearchQuery(
+            query,
+            config=settings.RECIPE_SEARCH_CONFIG,
+            search_type='websearch',
+        )
+        queryset = queryset.annotate(search=vector).filter(
+            search=search_query
+        ).annotate(search_rank=SearchRank(vector, search_query))
+    else:
+        terms = WORD_RE.findall(normalize(query))
+        if not terms:
+            return queryset.none()
+        if vendor == 'sqlite':
+            # MATCH и bm25() работают только в запросе к самой таблице
+            # FTS5, поэтому она присоединяется к рецептам через модель
+            # RecipeSearchEntry: коррелированный подзапрос повторял бы
+            # поиск на каждую строку. Столбец fts ссылается на таблицу
+            # через псевдоним запроса, поэтому поиск работает и в
+            # подзапросах.
+            match = ' '.join(f'"{term}"*' for term in terms)
+            table = F('search_entry__fts')
+            queryset = queryset.filter(search_entry__isnull=False).filter(
+                Func(
+                    table,
+                    Value(match),
+                    template='%(expressions)s',
+                    arg_joiner=' MATCH ',
+                    output_field=BooleanField(),
+                )
+            ).annotate(search_rank=-Func(
+                table, function='bm25', output_field=FloatField()
+            ))
+        else:
+            for term in terms:
+                queryset = queryset.filter(search_document__icontains=term)
+            return queryset
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
+
+
+def rank_ingredients(queryset, query):
+    """Ранжирует ингредиенты по триграммному сходству (PostgreSQL).
+
+    Условие записано операторами % и <%, чтобы использовался
+    GIN-индекс ingredient_name_trgm_idx из миграции 0010.
+    """
+
+    column = '"{}"."name"'.format(queryset.model._meta.db_table)
+    similarity = Func(
+        F('name'), Value(query),
+        function='similarity', output_field=FloatField(),
+    )
+    word_similarity = Func(
+        Value(query), F('name'),
+        function='word_similarity', output_field=FloatField(),
+    )
+    return queryset.filter(RawSQL(
+        f'{column} %% %s OR %s <%% {column}',
+        (query, query),
+        output_field=BooleanField(),
+    )).annotate(
+        search_rank=Greatest(similarity, word_similarity)
+    ).order_by('-search_rank', Length('name'), 'id')
@@ -0,0 +1,56 @@
+"""Обработчики сигналов приложения recipes."""
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import User
+
+from .counters import recount_user_links
+from .models import Ingredient, Recipe, ShoppingListItem, Tag
+from .search import delete_documents, refresh_documents
+from .versions import bump_version
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    ShoppingListItem.objects.remove_recipe(instance)
+
+
+@receiver(pre_delete, sender=User)
+def recount_deleted_user_links(sender, instance, **kwargs):
+    recount_user_links(instance)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_table_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_save, sender=Recipe)
+def count_created_recipe(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=F('recipes_count') - 1
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_search_document(sender, instance, **kwargs):
+    delete_documents(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def refresh_search_documents(sender, instance, created, **kwargs):
+    if not created:
+        lookup = 'tags' if sender is Tag else 'ingredients'
+        refresh_documents(Recipe.objects.filter(**{lookup: instance}))
@@ -0,0 +1,76 @@
+"""Версии таблиц справочников.
+
+Версия увеличивается при каждом изменении таблицы и вместе с временем
+изменения служит валидатором для условных GET-запросов и поколением
+для ключей кеша. Текущая версия хранится в кеше, поэтому при общем
+кеше все процессы видят её изменение сразу, а закешированные по
+старой версии данные просто перестают читаться.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DataVersion, Ingredient, Tag
+
+
+def get_version_name(model):
+    return model._meta.label_lower
+
+
+def get_version_cache_key(model):
+    return f'data-version:{get_version_name(model)}'
+
+
+def get_version(model):
+    """Возвращает пару (версия, время изменения) таблицы модели."""
+
+    key = get_version_cache_key(model)
+    version = cache.get(key)
+    if version is None:
+        data_version, _ = DataVersion.objects.get_or_create(
+            name=get_version_name(model)
+        )
+        version = (data_version.version, data_version.updated_at)
+        cache.set(key, version, settings.DATA_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def bump_version(model):
+    updated = DataVersion.objects.filter(
+        name=get_version_name(model)
+    ).update(version=F('version') + 1, updated_at=timezone.now())
+    if not updated:
+        DataVersion.objects.get_or_create(
+            name=get_version_name(model), defaults={'version': 1}
+        )
+    key = get_version_cache_key(model)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_versioned(model, name, default):
+    """Читает значение из кеша под ключом текущего поколения таблицы.
+
+    При промахе значение вычисляется вызовом default и сохраняется.
+    """
+
+    version, _ = get_version(model)
+    return cache.get_or_set(
+        f'{get_version_name(model)}:{version}:{name}',
+        default,
+        settings.REFERENCE_CACHE_TIMEOUT,
+    )
+
+
+def get_tags():
+    """Все тэги по id."""
+
+    return get_versioned(Tag, 'by-id', lambda: Tag.objects.in_bulk())
+
+
+def get_ingredient_ids():
+    return get_versioned(Ingredient, 'ids', lambda: frozenset(
+        Ingredient.objects.values_list('id', flat=True)
+    ))
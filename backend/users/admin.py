@@ -1,18 +1,28 @@
 from django.contrib import admin
 
+from recipes.counters import RecountOnDeleteMixin
+
 from .models import Follow, User
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'email', 'first_name', 'last_name',)
+    list_display = (
+        'id',
+        'username',
+        'email',
+        'first_name',
+        'last_name',
+        'recipes_count',
+        'followers_count',
+    )
     search_fields = ('username', 'email',)
     list_filter = ('email', 'first_name',)
     empty_value_display = '-пусто-'
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(RecountOnDeleteMixin, admin.ModelAdmin):
     list_display = ('user', 'author',)
     search_fields = ('author', 'user',)
     list_filter = ('author',)